@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import APIRouter, HTTPException
+
+from rag.rag_constants import INGEST_LOCK_TTL, INGEST_WORKERS, REGISTRY_FILE
+from rag.rag_pipeline import process
+from rag.registry import connect, heartbeat
+
+router = APIRouter()
+
+
+# ingestion jobs run on a bounded worker pool, status kept in SQLite so any worker can report it
+class JobQueue:
+    def __init__(self, path: str, max_workers: int, stale_after: float):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        self.stale_after = stale_after  # a job not refreshed for this long belongs to a dead worker
+        self.lock = threading.Lock()
+        # queued and running jobs of this process, kept fresh by the heartbeat
+        self.live = set()
+        self.conn = connect(path)
+        with self.lock:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, sha256 TEXT NOT NULL, path TEXT NOT NULL, status TEXT NOT NULL, '
+                'updated REAL NOT NULL, data TEXT NOT NULL)'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_active ON jobs (status, sha256)')
+        heartbeat(self._beat, stale_after / 4)
+
+    def _beat(self):
+        with self.lock:
+            if self.live:
+                ids = list(self.live)
+                self.conn.execute(f"UPDATE jobs SET updated = ? WHERE id IN ({','.join('?' * len(ids))})",
+                                  (time.time(), *ids))
+
+    def _active(self, column, value):
+        row = self.conn.execute(
+            f"SELECT data FROM jobs WHERE {column} = ? AND status IN ('queued', 'running') AND updated > ? "
+            "ORDER BY updated DESC LIMIT 1", (value, time.time() - self.stale_after)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, job):
+        with self.lock:
+            self.conn.execute('UPDATE jobs SET status = ?, updated = ?, data = ? WHERE id = ?',
+                              (job['status'], time.time(), json.dumps(job), job['id']))
+
+    # concurrent uploads of the same content share a job, across workers too
+    def submit(self, path, sha256, filename=None):
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                active = self._active('sha256', sha256)
+                if active:
+                    self.conn.execute('COMMIT')
+                    return active
+                job = {
+                    'id': str(uuid.uuid4()),
+                    'filename': filename or path,
+                    'path': path,
+                    'status': 'queued',
+                    'stage': 'queued',
+                    'stages': {},
+                    'doc_id': None,
+                    'error': None,
+                    'created': time.time()
+                }
+                self.conn.execute('INSERT INTO jobs (id, sha256, path, status, updated, data) VALUES (?, ?, ?, ?, ?, ?)',
+                                  (job['id'], sha256, path, job['status'], time.time(), json.dumps(job)))
+                self.conn.execute('COMMIT')
+                self.live.add(job['id'])
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        self.pool.submit(self._run, job, sha256)
+        return job
+
+    def _run(self, job, sha256):
+        job['status'] = 'running'
+        self._save(job)
+        try:
+            record = process(job['path'], sha256, progress=lambda stage: self._advance(job, stage))
+            job['doc_id'] = record['doc_id']
+            job['status'] = 'done'
+            self._advance(job, 'done')
+        except Exception as e:
+            traceback.print_exc()
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            self._save(job)
+        finally:
+            with self.lock:
+                self.live.discard(job['id'])
+
+    # record when each stage started so clients can see where time goes
+    def _advance(self, job, stage):
+        job['stage'] = stage
+        job['stages'][stage] = time.time()
+        self._save(job)
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pending_for_path(self, path):
+        with self.lock:
+            return self._active('path', path)
+
+    # most recent job for a path whatever its status, e.g. to report why ingestion failed
+    def latest_for_path(self, path):
+        with self.lock:
+            row = self.conn.execute('SELECT data FROM jobs WHERE path = ? ORDER BY updated DESC LIMIT 1',
+                                    (path,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+
+# the queue opens its database and worker pool on first use, not when the API is imported
+def get_jobs():
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = JobQueue(REGISTRY_FILE, INGEST_WORKERS, INGEST_LOCK_TTL)
+        return _jobs
+
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = get_jobs().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return job
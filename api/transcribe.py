@@ -1,38 +1,209 @@
+import asyncio
+import io
+import json
 import os
+import wave
 
-from fastapi import APIRouter
+from fastapi import (APIRouter, Depends, File, HTTPException, Response,
+                     UploadFile, WebSocket, WebSocketDisconnect)
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 
-from rag.rag_constants import ID_KEY
-from rag.rag_pipeline import process, records
-from rag.retriever_setup import vectorstore
-from transcribe import transcribe_user_question
-from utils.gemini import answer_with_gemini
+from api.jobs import get_jobs
+from api.upload import CLIENT_COOKIE, client_id
+from rag.eviction import touch
+from rag.query import Speculation, answer_question, stream_answer
+from rag.rag_constants import MAX_CLIP_SECONDS
+from rag.rag_pipeline import get_registry
+from rag.registry import file_sha256
+from transcribe import CHANNELS, RATE, QueueSource, TranscriptionSession, transcribe_user_question
+from utils.metrics import collect
+from utils.providers import ProviderError
+from utils.vad import VoiceActivityDetector, trim_silence
 
 router = APIRouter()
-from api.upload import current_doc_path
+# MAX_CLIP_SECONDS of 16-bit PCM, plus room for a WAV header
+MAX_CLIP_BYTES = MAX_CLIP_SECONDS * RATE * CHANNELS * 2 + 1024
 
 
-@router.post("/transcribe")
-def transcribe_and_answer():
+# record of the client's current document, or an error payload when it cannot be queried yet
+def _current_document(client):
+    current_doc_path = get_registry().current(client)
     if not current_doc_path or not os.path.exists(current_doc_path):
-        return {"error": "No document uploaded. Please upload a document first."}
+        return None, {"error": "No document uploaded. Please upload a document first."}
 
-    question = transcribe_user_question()
-    print(f"🎤Transcribed Question: {question}")
+    pending = get_jobs().pending_for_path(current_doc_path)
+    if pending:
+        return None, {"error": "Document is still being processed.", "job_id": pending["id"], "stage": pending["stage"]}
+
+    existing = get_registry().get_by_path(current_doc_path)
+    if existing:
+        return existing, None
+
+    # ingestion never runs inside a request: a failed job is reported, anything else is queued again
+    latest = get_jobs().latest_for_path(current_doc_path)
+    if latest and latest["status"] == "failed":
+        return None, {"error": f"Document processing failed: {latest['error']}", "job_id": latest["id"]}
+    print("⚠️ Not found in records. Re-processing.")
+    job = get_jobs().submit(current_doc_path, file_sha256(current_doc_path))
+    return None, {"error": "Document is still being processed.", "job_id": job["id"], "stage": job["stage"]}
+
+
+# timings=true adds the per-stage breakdown of this request to the response
+@router.post("/transcribe")
+def transcribe_and_answer(timings: bool = False, client: str = Depends(client_id)):
+    existing, error = _current_document(client)
+    if error:
+        return error
 
-    existing = next((r for r in records if r["path"] == current_doc_path), None)
-    if not existing:
-        print("⚠️ Not found in records. Re-processing.")
-        process(current_doc_path)
-        existing = next((r for r in records if r["path"] == current_doc_path), None)
+    with collect() as spans:
+        speculation = Speculation(existing["doc_id"])
+        question = transcribe_user_question(on_partial=speculation.on_partial)
+        result = _answer(existing, question, speculation)
+    if timings:
+        result["timings"] = spans
+    return result
 
-    docs = vectorstore.similarity_search(
-        question, k=3, filter={ID_KEY: existing["doc_id"]}
-    )
-    chunks = [doc.page_content for doc in docs]
-    answer = answer_with_gemini(question, chunks)
+
+def _answer(existing, question, speculation):
+    print(f"🎤Transcribed Question: {question}")
+    touch(get_registry(), existing["doc_id"])
+
+    try:
+        result = answer_question(question, existing["doc_id"], prepared=speculation.take(question))
+    except ProviderError as e:
+        return {"question": question, "error": str(e)}
 
     return {
         "question": question,
-        "answer": answer
+        "answer": result["answer"],
+        "citations": result["citations"],
+        "cached": result["cached"]
     }
+
+
+# 16 kHz mono 16-bit PCM from an uploaded WAV clip, anything without a RIFF header is taken as raw PCM
+def _read_pcm(data):
+    if data[:4] != b'RIFF':
+        return data
+    try:
+        with wave.open(io.BytesIO(data), 'rb') as wav:
+            if wav.getframerate() != RATE or wav.getnchannels() != CHANNELS or wav.getsampwidth() != 2:
+                raise ValueError(f"Expected {RATE} Hz mono 16-bit WAV audio.")
+            return wav.readframes(wav.getnframes())
+    except wave.Error as e:
+        raise ValueError(f"Unreadable WAV file: {e}")
+
+
+# the client records the question and uploads it, silence is trimmed before it goes to STT
+@router.post("/transcribe/audio")
+def transcribe_clip_and_answer(audio: UploadFile = File(...), timings: bool = False,
+                               client: str = Depends(client_id)):
+    existing, error = _current_document(client)
+    if error:
+        return error
+
+    # read at most one byte past the limit, a long clip is never held in memory whole
+    data = audio.file.read(MAX_CLIP_BYTES + 1)
+    if len(data) > MAX_CLIP_BYTES:
+        raise HTTPException(status_code=413, detail=f"Audio clip longer than {MAX_CLIP_SECONDS} seconds.")
+    try:
+        pcm = _read_pcm(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    frames, vad = trim_silence(pcm)
+    if not frames:
+        return {"error": "No speech detected in the audio clip."}
+
+    with collect() as spans:
+        speculation = Speculation(existing["doc_id"])
+        question = TranscriptionSession(audio_source=frames, on_partial=speculation.on_partial).run()
+        result = _answer(existing, question, speculation)
+    if timings:
+        result["timings"] = spans
+    result["audio"] = {"frames_in": vad.frames_in, "frames_sent": vad.frames_out,
+                       "bytes_sent": sum(len(f) for f in frames)}
+    return result
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Server-Sent Events: question, then context + citations, then answer tokens as they are generated
+@router.post("/transcribe/stream")
+def transcribe_and_stream_answer(response: Response, client: str = Depends(client_id)):
+    existing, error = _current_document(client)
+
+    def events():
+        if error:
+            yield _sse("error", error)
+            return
+        yield _sse("status", {"status": "listening"})
+        speculation = Speculation(existing["doc_id"])
+        question = transcribe_user_question(on_partial=speculation.on_partial)
+        print(f"🎤Transcribed Question: {question}")
+        yield _sse("question", {"question": question})
+        touch(get_registry(), existing["doc_id"])
+        try:
+            for event, data in stream_answer(question, existing["doc_id"], prepared=speculation.take(question)):
+                yield _sse(event, data)
+        except ProviderError as e:
+            yield _sse("error", {"error": str(e)})
+
+    stream = StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    # a returned response replaces the injected one, so carry over the client cookie set on it
+    stream.raw_headers.extend(h for h in response.raw_headers if h[0] == b'set-cookie')
+    return stream
+
+
+# live audio from the client: binary messages are 16 kHz mono 16-bit PCM, a text "end" message stops recording
+# speech frames are forwarded to STT as they arrive and the VAD closes the stream once the speaker goes quiet
+@router.websocket("/transcribe/ws")
+async def transcribe_socket(ws: WebSocket):
+    await ws.accept()
+    # browsers cannot set headers on a WebSocket, so the client id may also come as ?client_id=
+    client = ws.headers.get("X-Client-Id") or ws.query_params.get("client_id") or ws.cookies.get(CLIENT_COOKIE)
+    existing, error = await run_in_threadpool(_current_document, client)
+    if error:
+        await ws.send_json({"event": "error", "data": error})
+        await ws.close()
+        return
+
+    source = QueueSource()
+    vad = VoiceActivityDetector()
+    speculation = Speculation(existing["doc_id"])
+    session = TranscriptionSession(audio_source=source, on_partial=speculation.on_partial)
+    # start STT right away so frames are transcribed while the client is still talking
+    transcript = asyncio.create_task(run_in_threadpool(session.run, 60.0))
+    await ws.send_json({"event": "status", "data": {"status": "listening"}})
+
+    try:
+        try:
+            while not vad.ended:
+                message = await ws.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+                if message.get("bytes"):
+                    for frame in vad.feed(message["bytes"]):
+                        source.put(frame)
+                elif message.get("text") == "end":
+                    for frame in vad.finish():
+                        source.put(frame)
+        finally:
+            source.close()
+        question = await transcript
+
+        await ws.send_json({"event": "question", "data": {"question": question}})
+        print(f"🎤Transcribed Question: {question}")
+        touch(get_registry(), existing["doc_id"])
+        try:
+            events = stream_answer(question, existing["doc_id"], prepared=speculation.take(question))
+            async for event, data in iterate_in_threadpool(events):
+                await ws.send_json({"event": event, "data": data})
+        except ProviderError as e:
+            await ws.send_json({"event": "error", "data": {"error": str(e)}})
+        await ws.close()
+    except WebSocketDisconnect:
+        session.done.set()
@@ -1,37 +1,72 @@
 import os
+import uuid
 
-from fastapi import APIRouter, File, UploadFile
+from fastapi import (APIRouter, Depends, File, HTTPException, Request,
+                     Response, UploadFile)
 
-from rag.rag_pipeline import process, records
+from api.jobs import get_jobs
+from rag.eviction import storage_report
+from rag.rag_constants import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES
+from rag.rag_pipeline import get_registry
+from utils.files import UploadTooLarge, client_upload_dir, save_upload
 
 router = APIRouter()
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-current_doc_path = None
+CLIENT_COOKIE = "rag_client"
+
+
+# which client is asking: an X-Client-Id header, or a cookie handed out on first contact;
+# each client has its own current document, shared by every worker through the registry
+def client_id(request: Request, response: Response):
+    cid = request.headers.get("X-Client-Id") or request.cookies.get(CLIENT_COOKIE)
+    if not cid:
+        cid = str(uuid.uuid4())
+        response.set_cookie(CLIENT_COOKIE, cid, httponly=True, samesite="lax")
+    return cid
+
 
 @router.post("/upload")
-def upload_document(doc: UploadFile = File(...)):
-    global current_doc_path
-    path = os.path.join(UPLOAD_DIR, doc.filename)
+def upload_document(doc: UploadFile = File(...), client: str = Depends(client_id)):
+    # the name becomes a file in the client's upload directory, so it must name a file
+    filename = os.path.basename(doc.filename or '')
+    if filename in ('', '.', '..'):
+        raise HTTPException(status_code=400, detail="Upload must have a file name.")
+    path = os.path.join(client_upload_dir(UPLOAD_DIR, client), filename)
 
-    with open(path, "wb") as f:
-        f.write(doc.file.read())
+    # reject early when the client declared the size up front
+    if doc.size is not None and doc.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large.")
+    try:
+        sha256, _ = save_upload(doc.file, path, MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
-    existing = next((r for r in records if r["path"] == path), None)
+    registry = get_registry()
+    existing = registry.get_by_hash(sha256)
 
     if existing:
-        current_doc_path = path
+        registry.add_alias(existing, path)
+        registry.set_current(client, path)
         return {
             "filename": doc.filename,
             "message": "Document already processed.",
             "can_use_mic": True
         }
 
-    process(path)
-    current_doc_path = path
+    # ingestion runs in the background, clients poll /jobs/{job_id}
+    job = get_jobs().submit(path, sha256, doc.filename)
+    registry.set_current(client, path)
     return {
         "filename": doc.filename,
-        "message": "Document uploaded and processed successfully.",
-        "can_use_mic": True
+        "job_id": job["id"],
+        "message": "Document queued for processing.",
+        "can_use_mic": False
     }
+
+
+# per-document storage cost and usage, as seen by the eviction policy
+@router.get("/documents")
+def list_documents():
+    return storage_report(get_registry())
@@ -1,18 +1,19 @@
 import os
+import uuid
 
-import google.generativeai as genai
 import streamlit as st
 from dotenv import load_dotenv
 
-from rag.rag_constants import ID_KEY
-from rag.rag_pipeline import process, records
-from rag.retriever_setup import vectorstore
+from rag.eviction import touch
+from rag.query import Speculation, stream_answer
+from rag.rag_constants import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES
+from rag.rag_pipeline import get_registry, process
 from transcribe import transcribe_user_question
+from utils.files import client_upload_dir, save_upload
+from utils.providers import ProviderError
 
 # Load environment variables
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_IMAGE_API_KEY"))
-model = genai.GenerativeModel("models/gemini-2.5-flash-lite-preview-06-17")
 
 # Streamlit page config
 st.set_page_config(page_title="Voice-Based RAG", layout="centered")
@@ -23,57 +24,62 @@ if "doc_path" not in st.session_state:
     st.session_state.doc_path = None
 if "doc_id" not in st.session_state:
     st.session_state.doc_id = None
+# each browser session uploads into its own directory, like a client of the API
+if "client_id" not in st.session_state:
+    st.session_state.client_id = str(uuid.uuid4())
 
 # uploading the PDF
 uploaded = st.file_uploader("📄 Upload a PDF document", type="pdf")
-if uploaded is not None:
+if uploaded is not None and uploaded.size > MAX_UPLOAD_BYTES:
+    st.error("File too large.")
+elif uploaded is not None:
     with st.spinner("Processing PDF..."):
-        path = os.path.join("uploads/", uploaded.name)
-        os.makedirs("uploads", exist_ok=True)
-        with open(path, "wb") as f:
-            f.write(uploaded.read())
+        path = os.path.join(client_upload_dir("uploads", st.session_state.client_id), os.path.basename(uploaded.name))
+        sha256, _ = save_upload(uploaded, path, MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES)
         st.session_state.doc_path = path
 
         # Check if already processed
-        existing = next((r for r in records if r['path'] == path), None)
+        registry = get_registry()
+        existing = registry.get_by_hash(sha256)
         if existing:
+            registry.add_alias(existing, path)
             st.session_state.doc_id = existing["doc_id"]
             st.info("Document already processed.")
         else:
-            process(path)
-            st.session_state.doc_id = next(
-                (r["doc_id"] for r in records if r["path"] == path), None
-            )
+            st.session_state.doc_id = process(path, sha256)["doc_id"]
             st.success("PDF processed successfully!")
 
 # Mic Button
 if st.session_state.doc_path:
     st.markdown("### 🎤 Ask a Question via Voice")
     if st.button("🎙️ Record Question"):
+        speculation = Speculation(st.session_state.doc_id) if st.session_state.doc_id else None
         with st.spinner("Transcribing your voice..."):
-            question = transcribe_user_question()
+            question = transcribe_user_question(on_partial=speculation.on_partial if speculation else None)
             st.markdown("**Transcribed Question:**")
             st.info(question)
 
         # Perform RAG only if doc_id exists
         if st.session_state.doc_id:
-            docs = vectorstore.similarity_search(
-                question, k=3,
-                filter={ID_KEY: st.session_state.doc_id}
-            )
-            context = "\n\n".join(d.page_content for d in docs)
+            touch(get_registry(), st.session_state.doc_id)
+            events = stream_answer(question, st.session_state.doc_id, prepared=speculation.take(question))
+            try:
+                # query embedding and retrieval run here, they can fail on the provider too
+                with st.spinner("Retrieving context..."):
+                    event, retrieved = next(events)
 
-            st.markdown("#### 📚 Retrieved Context")
-            for i, doc in enumerate(docs):
-                st.markdown(f"**Chunk {i+1}**")
-                st.info(doc.page_content)
+                st.markdown("#### 📚 Retrieved Context")
+                for i, chunk in enumerate(retrieved["context"]):
+                    st.markdown(f"**Chunk {i+1}**")
+                    st.info(chunk)
 
-            # Ask Gemini
-            st.markdown("#### 🤖 Gemini Answer")
-            with st.spinner("Generating answer..."):
-                prompt = f"Answer the question using the following context:\n\n{context}\n\nQuestion: {question}"
-                response = model.generate_content(prompt)
-                st.success(response.text)
+                # Ask Gemini, the answer is rendered token by token
+                st.markdown("#### 🤖 Gemini Answer")
+                if retrieved["cached"]:
+                    st.caption("Answered from cache for a similar earlier question.")
+                st.write_stream(data for event, data in events if event == "token")
+            except ProviderError as e:
+                st.error(f"Provider error: {e}")
         else:
             st.error("Document not processed correctly. Please re-upload.")
 
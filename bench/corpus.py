@@ -0,0 +1,105 @@
+import os
+import random
+
+import numpy as np
+import pymupdf
+
+# generated documents of increasing size, figure count and table density
+SPECS = {
+    'small': {'pages': 4, 'figures': 2, 'tables': 1},
+    'text_heavy': {'pages': 24, 'figures': 0, 'tables': 0},
+    'figure_heavy': {'pages': 8, 'figures': 16, 'tables': 0},
+    'table_heavy': {'pages': 8, 'figures': 0, 'tables': 16},
+    'large': {'pages': 48, 'figures': 24, 'tables': 12},
+}
+
+VOCAB = (
+    'sensor controller actuator buffer pipeline encoder decoder signal channel register '
+    'voltage current latency throughput bandwidth packet frame queue scheduler interrupt '
+    'memory cache bus clock power thermal battery inverter motor feedback loop filter '
+    'amplifier converter sample threshold calibration protocol gateway module firmware'
+).split()
+
+PAGE_W, PAGE_H, MARGIN = 612, 792, 72
+
+
+def _sentence(rng):
+    words = rng.sample(VOCAB, rng.randint(8, 14))
+    return ' '.join(words).capitalize() + '.'
+
+
+def _paragraph(rng, sentences):
+    return ' '.join(_sentence(rng) for _ in range(sentences))
+
+
+# blocky RGB image, varied enough to pass the entropy and near-duplicate filters
+def _figure_png(seed, width=320, height=200, block=20):
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, size=(height // block, width // block, 3), dtype=np.uint8)
+    pixels = np.ascontiguousarray(blocks.repeat(block, axis=0).repeat(block, axis=1))
+    return pymupdf.Pixmap(pymupdf.csRGB, width, height, pixels.tobytes(), 0).tobytes('png')
+
+
+def _draw_table(page, rng, top, rows=6, cols=4, row_h=24):
+    col_w = (PAGE_W - 2 * MARGIN) / cols
+    for r in range(rows):
+        for c in range(cols):
+            rect = pymupdf.Rect(MARGIN + c * col_w, top + r * row_h, MARGIN + (c + 1) * col_w, top + (r + 1) * row_h)
+            page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+            text = rng.choice(VOCAB) if r == 0 else f"{rng.uniform(0, 1000):.2f}"
+            page.insert_text((rect.x0 + 4, rect.y1 - 8), text, fontsize=9)
+    return top + rows * row_h
+
+
+# one document: a heading and paragraphs per page, figures and tables spread evenly across pages
+def make_pdf(path, pages, figures, tables, seed=0):
+    rng = random.Random(seed)
+    doc = pymupdf.open()
+    sentences = []
+    for p in range(pages):
+        page = doc.new_page(width=PAGE_W, height=PAGE_H)
+        page.insert_text((MARGIN, MARGIN), f"Section {p + 1}: {rng.choice(VOCAB).capitalize()} design", fontsize=16)
+        text = _paragraph(rng, 6)
+        sentences += text.split('. ')
+        page.insert_textbox(pymupdf.Rect(MARGIN, MARGIN + 16, PAGE_W - MARGIN, 330), text, fontsize=10)
+
+        top = 340
+        for f in range(p, figures, pages):
+            rect = pymupdf.Rect(MARGIN, top, MARGIN + 240, top + 150)
+            page.insert_image(rect, stream=_figure_png(seed * 1000 + f))
+            page.insert_text((MARGIN + 250, top + 20), f"Figure {f + 1}", fontsize=9)
+            top += 160
+            if top > PAGE_H - 200:
+                break
+        for _ in range(p, tables, pages):
+            if top > PAGE_H - MARGIN - 150:
+                break
+            top = _draw_table(page, rng, top) + 10
+    doc.save(path)
+    doc.close()
+    return sentences
+
+
+# questions built from the document's own sentences, plus short keyword queries for the lexical fast path
+def make_questions(sentences, count, seed=0):
+    rng = random.Random(seed)
+    questions = []
+    for i in range(count):
+        words = rng.choice(sentences).rstrip('.').lower().split()
+        if i % 4 == 3:
+            questions.append(' '.join(rng.sample(words, 2)))
+        else:
+            picked = rng.sample(words, 3)
+            questions.append(f"How does the {picked[0]} relate to the {picked[1]} and {picked[2]}?")
+    return questions
+
+
+def generate(out_dir, names=None, seed=0):
+    os.makedirs(out_dir, exist_ok=True)
+    corpus = []
+    for i, name in enumerate(names or SPECS):
+        spec = SPECS[name]
+        path = os.path.join(out_dir, f"{name}.pdf")
+        sentences = make_pdf(path, seed=seed + i, **spec)
+        corpus.append({'name': name, 'path': path, 'sentences': sentences, **spec})
+    return corpus
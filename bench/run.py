@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+# offline benchmark: ingestion and query latency against stub providers, no network needed
+#   python -m bench.run --out bench/results/base.json
+#   python -m bench.run --compare bench/results/base.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def _latency(samples):
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    if not ms.size:
+        return {'count': 0}
+    return {
+        'count': int(ms.size), 'mean_ms': float(ms.mean()), 'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)), 'p99_ms': float(np.percentile(ms, 99)), 'max_ms': float(ms.max())
+    }
+
+
+# stage durations come from the progress callback, each stage runs until the next one starts
+def bench_ingest(corpus):
+    from rag.rag_pipeline import process
+
+    documents = []
+    for doc in corpus:
+        marks = []
+        start = time.perf_counter()
+        record = process(doc['path'], progress=lambda stage: marks.append((stage, time.perf_counter())))
+        end = time.perf_counter()
+        bounds = marks + [('done', end)]
+        documents.append({
+            'name': doc['name'], 'pages': doc['pages'], 'figures': doc['figures'], 'tables': doc['tables'],
+            'doc_id': record['doc_id'], 'chunks': record['chunks'], 'images': record['images'],
+            'seconds': end - start,
+            'stages': {stage: t1 - t0 for (stage, t0), (_, t1) in zip(bounds, bounds[1:])}
+        })
+
+    def total(stage):
+        return sum(d['stages'].get(stage, 0.0) for d in documents) or float('nan')
+
+    pages = sum(d['pages'] for d in documents)
+    throughput = {
+        'pages_per_s': pages / sum(d['seconds'] for d in documents),
+        'extract_pages_per_s': pages / total('extracting'),
+        'caption_images_per_s': sum(d['images']['total'] for d in documents) / total('captioning'),
+        'embed_chunks_per_s': sum(d['chunks'] for d in documents) / total('embedding')
+    }
+    return {'documents': documents, 'throughput': throughput}
+
+
+# blocking answers, time to first streamed token, and repeats served by the answer cache
+def bench_queries(documents, questions):
+    from rag.query import answer_question, stream_answer
+
+    answer, first_token, repeat = [], [], []
+    for doc in documents:
+        for question in questions[doc['name']]:
+            start = time.perf_counter()
+            answer_question(question, doc['doc_id'])
+            answer.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for event, _ in stream_answer(question + ' in detail', doc['doc_id']):
+                if event == 'token':
+                    first_token.append(time.perf_counter() - start)
+                    break
+
+            start = time.perf_counter()
+            answer_question(question, doc['doc_id'])
+            repeat.append(time.perf_counter() - start)
+    return {'answer': _latency(answer), 'first_token': _latency(first_token), 'repeat': _latency(repeat)}
+
+
+# 16 kHz PCM: silence, a tone standing in for speech, trailing silence
+def _clip(speech_s=1.5, silence_s=0.5, rate=16000):
+    t = np.arange(int(speech_s * rate)) / rate
+    tone = (3000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+    silence = np.zeros(int(silence_s * rate), dtype=np.int16)
+    return np.concatenate([silence, tone, silence]).tobytes()
+
+
+# the synthetic clip as a 16 kHz mono WAV, replayed like a recorded question when no --clip is given
+def _write_clip(path, rate=16000):
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(_clip(rate=rate))
+    return path
+
+
+# voice question end to end: VAD trim, streaming STT with speculative retrieval, answer
+def bench_voice(documents, questions, latency, clip_path):
+    from bench.stubs import StubSTTServer
+    from rag.query import Speculation, answer_question
+    from transcribe import TranscriptionSession, WavFileSource
+    from utils.vad import trim_silence
+
+    server = StubSTTServer(latency)
+    # recorded audio replayed from the WAV file; realtime pacing is skipped, the stub socket has no clock
+    clip = b''.join(WavFileSource(clip_path, realtime=False))
+    samples, sent = [], 0
+    try:
+        for doc in documents:
+            for question in questions[doc['name']]:
+                question = f"Explain {question}"
+                server.expect(question)
+                start = time.perf_counter()
+                frames, _ = trim_silence(clip)
+                speculation = Speculation(doc['doc_id'])
+                text = TranscriptionSession(audio_source=frames, ws_url=server.url, api_key='stub',
+                                            on_partial=speculation.on_partial).run()
+                answer_question(text, doc['doc_id'], prepared=speculation.take(text))
+                samples.append(time.perf_counter() - start)
+                sent += sum(len(f) for f in frames)
+    finally:
+        server.close()
+    return {'latency': _latency(samples), 'audio_bytes_per_question': sent / max(1, len(samples)), 'clip_bytes': len(clip)}
+
+
+def run(args):
+    work = tempfile.mkdtemp(prefix='ragbench-')
+    # every store uses paths relative to the working directory, so each run starts cold and isolated
+    os.chdir(work)
+    sys.path.insert(0, ROOT)
+    try:
+        from bench.corpus import generate, make_questions
+        from bench.stubs import install
+        from utils.providers import provider_stats
+
+        stubs = install(groq=args.groq_ms / 1000, cohere=args.cohere_ms / 1000,
+                        gemini=args.gemini_ms / 1000, token=args.token_ms / 1000)
+        corpus = generate(os.path.join(work, 'uploads'), args.docs, seed=args.seed)
+        questions = {d['name']: make_questions(d['sentences'], args.queries, seed=args.seed) for d in corpus}
+
+        results = {'commit': _commit(), 'timestamp': time.time(), 'config': vars(args)}
+        results['ingest'] = bench_ingest(corpus)
+        results['query'] = bench_queries(results['ingest']['documents'], questions)
+        if not args.skip_voice:
+            clip = args.clip or _write_clip(os.path.join(work, 'clip.wav'))
+            results['voice'] = bench_voice(results['ingest']['documents'], questions, args.stt_ms / 1000, clip)
+        results['provider_calls'] = {name: stub.calls if hasattr(stub, 'calls') else stub.chat.completions.calls
+                                     for name, stub in stubs.items()}
+        results['providers'] = provider_stats()
+        return results
+    finally:
+        os.chdir(ROOT)
+        if args.keep:
+            print('Kept working directory:', work)
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+# metrics where lower is better, everything else compared is a throughput
+def _compared(results):
+    metrics = {f"throughput.{k}": v for k, v in results['ingest']['throughput'].items()}
+    for section in ('query', 'voice'):
+        for name, stats in results.get(section, {}).items():
+            if isinstance(stats, dict):
+                metrics.update({f"{section}.{name}.{k}": v for k, v in stats.items() if k.endswith('_ms')})
+    return metrics
+
+
+def compare(old, new, threshold):
+    before, after = _compared(old), _compared(new)
+    regressions = []
+    print(f"\n{'metric':40} {'before':>12} {'after':>12} {'change':>8}")
+    for name in sorted(set(before) & set(after)):
+        a, b = before[name], after[name]
+        change = (b - a) / a if a else 0.0
+        worse = change > threshold if name.endswith('_ms') else change < -threshold
+        if worse:
+            regressions.append(name)
+        print(f"{name:40} {a:12.2f} {b:12.2f} {change:+8.1%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def summarize(results):
+    for doc in results['ingest']['documents']:
+        stages = ', '.join(f"{k} {v:.2f}s" for k, v in doc['stages'].items())
+        print(f"{doc['name']:14} {doc['pages']:3} pages {doc['chunks']:4} chunks  {doc['seconds']:.2f}s ({stages})")
+    for name, value in results['ingest']['throughput'].items():
+        print(f"{name:24} {value:.2f}")
+    for section in ('query', 'voice'):
+        for name, stats in results.get(section, {}).items():
+            if isinstance(stats, dict) and stats.get('count'):
+                print(f"{section}.{name:14} n={stats['count']:<4} p50 {stats['p50_ms']:.1f}ms  "
+                      f"p95 {stats['p95_ms']:.1f}ms  p99 {stats['p99_ms']:.1f}ms")
+
+
+def main():
+    from bench.corpus import SPECS
+
+    parser = argparse.ArgumentParser(description='Offline ingestion and query benchmark with stub providers.')
+    parser.add_argument('--docs', nargs='*', default=list(SPECS), choices=list(SPECS))
+    parser.add_argument('--queries', type=int, default=20, help='questions per document')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--groq-ms', type=float, default=300, help='caption latency per image')
+    parser.add_argument('--cohere-ms', type=float, default=80, help='embedding latency per call')
+    parser.add_argument('--gemini-ms', type=float, default=250, help='answer time to first token')
+    parser.add_argument('--token-ms', type=float, default=5, help='latency per streamed token')
+    parser.add_argument('--stt-ms', type=float, default=150, help='final transcript latency after end of speech')
+    parser.add_argument('--skip-voice', action='store_true')
+    parser.add_argument('--clip', help='recorded 16 kHz mono 16-bit WAV question to replay, synthetic tone by default')
+    parser.add_argument('--out', help='write results as JSON')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change reported as a regression')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary working directory')
+    args = parser.parse_args()
+    out = os.path.abspath(args.out) if args.out else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    # run() changes into a temporary directory
+    args.clip = os.path.abspath(args.clip) if args.clip else None
+
+    results = run(args)
+    summarize(results)
+    if out:
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        with open(out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Results written to', out)
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import queue
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# deterministic local stand-ins for Groq, Cohere, Gemini and AssemblyAI
+# latency is in seconds per call, stream latency is per token on top of the time to first token
+
+
+def _sleep(seconds):
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def _digest(text, size=4):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=size).digest(), 'little')
+
+
+# Groq vision captions, derived from the image bytes so repeated figures get the same caption
+class _Completions:
+    def __init__(self, latency, token_latency):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.calls = 0
+
+    def create(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        _sleep(self.latency)
+        image = next(p['image_url']['url'] for p in messages[0]['content'] if p['type'] == 'image_url')
+        text = f"Diagram {_digest(image):08x} showing an input block connected to a processing stage and an output block."
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+        return self._stream(text)
+
+    def _stream(self, text):
+        for word in text.split():
+            _sleep(self.token_latency)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + ' '))])
+
+
+class StubGroq:
+    def __init__(self, latency=0.0, token_latency=0.0):
+        self.chat = SimpleNamespace(completions=_Completions(latency, token_latency))
+
+
+# Cohere embeddings as normalized hashed bag-of-words, so similar text gets similar vectors
+class StubEmbeddings(Embeddings):
+    def __init__(self, dim=1024, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            vector[_digest(token) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        _sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        _sleep(self.latency)
+        return self._vector(text)
+
+
+# Gemini answers, `latency` is the time to first token
+class StubGemini:
+    def __init__(self, latency=0.0, token_latency=0.0, tokens=40):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.tokens = tokens
+        self.calls = 0
+
+    def _words(self, prompt):
+        seed = _digest(prompt)
+        return [f"w{(seed + i) % 997}" for i in range(self.tokens)]
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        self.calls += 1
+        _sleep(self.latency)
+        words = self._words(prompt)
+        if not stream:
+            _sleep(self.token_latency * len(words))
+            return SimpleNamespace(text=' '.join(words), parts=words)
+        return self._stream(words)
+
+    def _stream(self, words):
+        for word in words:
+            _sleep(self.token_latency)
+            yield SimpleNamespace(text=word + ' ', parts=[word])
+
+
+# AssemblyAI v3 streaming socket: partial turns while audio arrives, the formatted turn after ForceEndpoint
+# transcripts are scripted with expect(), one per connection, since the audio is synthetic
+class StubSTTServer:
+    def __init__(self, latency=0.0, frames_per_word=4, host='127.0.0.1'):
+        from websockets.sync.server import serve
+        self.latency = latency
+        self.frames_per_word = frames_per_word
+        self.expected = queue.Queue()
+        self.server = serve(self._handle, host, 0)
+        self.url = f"ws://{host}:{self.server.socket.getsockname()[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def expect(self, transcript):
+        self.expected.put(transcript)
+
+    def _turn(self, ws, text, end_of_turn=False, formatted=False):
+        ws.send(json.dumps({'type': 'Turn', 'transcript': text, 'end_of_turn': end_of_turn, 'turn_is_formatted': formatted}))
+
+    def _handle(self, ws):
+        from websockets.exceptions import ConnectionClosed
+        words = self.expected.get(timeout=10).split()
+        spoken = lambda n: re.sub(r"[^\w' ]", '', ' '.join(words[:n]).lower())
+        frames = 0
+        try:
+            for message in ws:
+                if isinstance(message, bytes):
+                    frames += 1
+                    if frames % self.frames_per_word == 0 and frames // self.frames_per_word <= len(words):
+                        self._turn(ws, spoken(frames // self.frames_per_word))
+                elif json.loads(message).get('type') == 'ForceEndpoint':
+                    _sleep(self.latency)
+                    self._turn(ws, spoken(len(words)), end_of_turn=True)
+                    self._turn(ws, ' '.join(words), end_of_turn=True, formatted=True)
+        except ConnectionClosed:
+            pass
+
+    def close(self):
+        self.server.shutdown()
+
+
+# swap the provider clients used by the pipeline for stubs, must run before the first provider call
+def install(groq=0.0, cohere=0.0, gemini=0.0, token=0.0):
+    import rag.captioning
+    import utils.gemini
+    import utils.providers
+    from rag.retriever_setup import EMBED_DIM
+
+    stubs = {
+        'groq': StubGroq(groq, token),
+        'cohere': StubEmbeddings(EMBED_DIM, cohere),
+        'gemini': StubGemini(gemini, token)
+    }
+    rag.captioning.get_groq_client = lambda: stubs['groq']
+    utils.providers.get_cohere_embeddings = lambda model: stubs['cohere']
+    utils.gemini.get_gemini_model = lambda name: stubs['gemini']
+    return stubs
@@ -18,6 +18,13 @@ class VoiceAssistant {
     
     this.isListening = false;
     this.uploadedFiles = [];
+
+    // stable per-browser id, the server keeps each client's current document apart
+    this.clientId = localStorage.getItem("rag-client-id");
+    if (!this.clientId) {
+      this.clientId = crypto.randomUUID();
+      localStorage.setItem("rag-client-id", this.clientId);
+    }
     
     this.init();
   }
@@ -98,7 +105,7 @@ class VoiceAssistant {
 
       this.uploadedFiles.push(file);
       this.addFileToList(file);
-      this.showNotification(`File uploaded: ${file.name}`, 'success');
+      this.uploadFile(file);
     });
 
     if (this.uploadedFiles.length > 0) {
@@ -109,6 +116,50 @@ class VoiceAssistant {
     this.fileInput.value = '';
   }
 
+  // send the file to /upload under this browser's client id, so it becomes the document questions are asked about
+  async uploadFile(file) {
+    const form = new FormData();
+    form.append('doc', file);
+    try {
+      const response = await fetch("http://127.0.0.1:8000/upload", {
+        method: 'POST',
+        headers: { 'X-Client-Id': this.clientId },
+        body: form
+      });
+      const data = await response.json();
+      if (!response.ok) {
+        this.showNotification(data.detail || `Upload failed: ${file.name}`, 'error');
+        return;
+      }
+      if (!data.job_id) {
+        this.showNotification(`File ready: ${file.name}`, 'success');
+        return;
+      }
+      this.showNotification(`Processing: ${file.name}`, 'info');
+      await this.waitForJob(data.job_id, file.name);
+    } catch (error) {
+      console.error("Upload error:", error);
+      this.showNotification(`Could not upload ${file.name}. Please make sure the server is running.`, 'error');
+    }
+  }
+
+  // poll the ingestion job until the document can be queried
+  async waitForJob(jobId, fileName) {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, 2000));
+      const response = await fetch(`http://127.0.0.1:8000/jobs/${jobId}`);
+      const job = await response.json();
+      if (job.status === 'done') {
+        this.showNotification(`File ready: ${fileName}`, 'success');
+        return;
+      }
+      if (job.status === 'failed' || !response.ok) {
+        this.showNotification(`Processing failed for ${fileName}: ${job.error || job.detail}`, 'error');
+        return;
+      }
+    }
+  }
+
   addFileToList(file) {
     const fileItem = document.createElement('div');
     fileItem.className = 'file-item';
@@ -296,11 +347,12 @@ class VoiceAssistant {
         })) : []
       };
       
-      // Make API call
-      const response = await fetch("http://127.0.0.1:8000/transcribe", {
+      // Make API call, the answer is streamed back as Server-Sent Events
+      const response = await fetch("http://127.0.0.1:8000/transcribe/stream", {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'X-Client-Id': this.clientId,
         },
         body: JSON.stringify(requestData)
       });
@@ -309,10 +361,19 @@ class VoiceAssistant {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
       
-      const data = await response.json();
-      
-      // Update UI with transcription
-      this.showTranscription(data.question);
+      await this.readEventStream(response, (event, data) => {
+        if (event === 'question') {
+          // Update UI with transcription
+          this.showTranscription(data.question);
+          this.startAnswer();
+        } else if (event === 'context') {
+          this.showCitations(data.citations);
+        } else if (event === 'token') {
+          this.appendAnswer(data);
+        } else if (event === 'error') {
+          this.showError(data.error);
+        }
+      });
       
     } catch (error) {
       console.error("Error:", error);
@@ -322,6 +383,55 @@ class VoiceAssistant {
     }
   }
 
+  // parse a text/event-stream body, calling onEvent(event, data) for each message as it arrives
+  async readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const message = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        
+        let event = 'message';
+        let data = '';
+        message.split('\n').forEach(line => {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        onEvent(event, data ? JSON.parse(data) : null);
+      }
+    }
+  }
+
+  startAnswer() {
+    this.answerBox.innerHTML = `
+      <div class="answer-citations" style="color: rgba(255, 255, 255, 0.6); font-size: 0.8rem; margin-bottom: 0.5rem;"></div>
+      <p class="answer-stream" style="color: rgba(255, 255, 255, 0.95); line-height: 1.6; white-space: pre-wrap;"></p>
+    `;
+    this.answerText = this.answerBox.querySelector('.answer-stream');
+    this.answerCitations = this.answerBox.querySelector('.answer-citations');
+  }
+
+  showCitations(citations) {
+    if (!this.answerCitations || !citations) return;
+    const labels = citations
+      .filter(c => c.page)
+      .map(c => c.type === 'image' ? `Figure ${c.figure}, Page ${c.page}` : `Page ${c.page}`);
+    this.answerCitations.textContent = labels.length ? `Sources: ${labels.join(' · ')}` : '';
+  }
+
+  appendAnswer(token) {
+    if (!this.answerText) this.startAnswer();
+    this.answerText.textContent += token;
+  }
+
   startListening() {
     this.isListening = true;
     this.micBtn.classList.add("listening");
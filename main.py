@@ -1,12 +1,12 @@
-import os
-
-import google.generativeai as genai
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+from api.jobs import router as jobs_router
 from api.transcribe import router as transcribe_router
 from api.upload import router as upload_router
+from utils.metrics import render
 
 app = FastAPI()
 
@@ -21,6 +21,13 @@ app.add_middleware(
 # Register API routers
 app.include_router(upload_router)
 app.include_router(transcribe_router)
+app.include_router(jobs_router)
+
+
+# stage latency histograms, size counters and provider call stats for Prometheus to scrape
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return render()
 
 if __name__ == "__main__":
     # running the app on local host
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from rag.rag_constants import (ANSWER_CACHE_MAX_ENTRIES,
+                               ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL)
+
+
+# per-document cache of answers, matched on question embedding similarity
+class SemanticAnswerCache:
+    def __init__(self, threshold: float, ttl: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.docs = {}  # doc_id -> OrderedDict(question -> entry), least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        return v / (np.linalg.norm(v) or 1.0)
+
+    # live entries of a document, expired ones dropped; call with the lock held
+    def _entries(self, doc_id):
+        entries = self.docs.get(doc_id)
+        if entries:
+            now = time.time()
+            for question in [q for q, e in entries.items() if now - e['time'] > self.ttl]:
+                del entries[question]
+        return entries
+
+    # closest recent question for this document, if within the similarity threshold
+    def lookup(self, doc_id, vector):
+        with self.lock:
+            entries = self._entries(doc_id)
+            # keyword queries answered without an embedding have no vector to compare
+            questions = [q for q, e in entries.items() if e['vector'] is not None] if entries else []
+            if not questions:
+                self.misses += 1
+                return None
+
+            scores = np.stack([entries[q]['vector'] for q in questions]) @ self._unit(vector)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            entries.move_to_end(questions[best])
+            self.hits += 1
+            return entries[questions[best]]
+
+    # the same query asked again, for keyword queries that skip the embedding call
+    def get(self, doc_id, question):
+        with self.lock:
+            entries = self._entries(doc_id)
+            entry = entries.get(question) if entries else None
+            if entry is None:
+                self.misses += 1
+                return None
+            entries.move_to_end(question)
+            self.hits += 1
+            return entry
+
+    def store(self, doc_id, question, vector, answer, context, citations):
+        with self.lock:
+            entries = self.docs.setdefault(doc_id, OrderedDict())
+            entries[question] = {
+                'vector': None if vector is None else self._unit(vector),
+                'answer': answer,
+                'context': context,
+                'citations': citations,
+                'time': time.time()
+            }
+            entries.move_to_end(question)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    # called when a document is evicted or replaced
+    def invalidate(self, doc_id):
+        with self.lock:
+            self.docs.pop(doc_id, None)
+
+
+answer_cache = SemanticAnswerCache(ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES)
@@ -1,45 +1,92 @@
 import base64
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
-from groq import Groq
+from rag.rag_constants import (CAPTION_BURST, CAPTION_CACHE_FILE,
+                               CAPTION_CACHE_MAX_BYTES, CAPTION_MAX_RETRIES,
+                               CAPTION_MAX_WORKERS, CAPTION_RATE_PER_SEC)
+from utils.metrics import span
+from utils.providers import ProviderError, call, get_groq_client
+from utils.rate_limit import TokenBucket
+from utils.sqlite_cache import SQLiteCache, content_key
 
-from rag.rag_constants import GROQ_API_KEY
+CAPTION_MODEL = 'meta-llama/llama-4-scout-17b-16e-instruct'
+CAPTION_PROMPT = 'Describe the image in detail along with its components under 150 words.Also mention the connection of components like which component is connected to which. Provide the control flow'
 
-client = Groq(api_key=GROQ_API_KEY)
+# repeated figures (same bytes) are answered from disk instead of the vision model
+@lru_cache(maxsize=None)
+def get_caption_cache():
+    return SQLiteCache(CAPTION_CACHE_FILE, CAPTION_CACHE_MAX_BYTES)
+
+# shared across all captioning threads so the provider quota is respected
+rate_limiter = TokenBucket(CAPTION_RATE_PER_SEC, CAPTION_BURST)
+
+# single streamed vision request, raises on failure so it can be retried
+def _request_caption(image_data_url):
+    rate_limiter.acquire()
+    # generate caption of the image through prompts + image
+    completion = get_groq_client().chat.completions.create(
+        model=CAPTION_MODEL,
+        messages=[
+            {
+                'role': 'user',
+                'content': [
+                    {
+                        'type': 'text',
+                        'text': CAPTION_PROMPT
+                    },
+                    {
+                        'type': 'image_url',
+                        'image_url': {'url': image_data_url}
+                    }
+                ]
+            }
+        ],
+        temperature=0.1,
+        max_completion_tokens=1000,
+        top_p=1,
+        stream=True
+    )
+    return ''.join(chunk.choices[0].delta.content or '' for chunk in completion).strip()
 
 # Adding captions to each image in image path
-def caption_image(image_path):
+def caption_image(image_path, doc_id=None):
     with open(image_path, 'rb') as f:
-        image_bytes = f.read()
-    
-    # converting the image to base64 form and then to url 
+        return caption_bytes(f.read(), doc_id)
+
+# caption in-memory image bytes, served from the cache when seen before
+def caption_bytes(image_bytes, doc_id=None):
+    key = content_key(image_bytes, CAPTION_MODEL, CAPTION_PROMPT)
+    cached = get_caption_cache().get(key)
+    if cached is not None:
+        return cached.decode('utf-8')
+
+    # converting the image to base64 form and then to url
     image_b64 = base64.b64encode(image_bytes).decode('utf-8')
     image_data_url = f"data:image/png;base64,{image_b64}"
 
     try:
-        # generate caption of the image through prompts + image
-        completion = client.chat.completions.create(
-            model='meta-llama/llama-4-scout-17b-16e-instruct',
-            messages=[
-                {
-                    'role': 'user',
-                    'content': [
-                        {
-                            'type': 'text',
-                            'text': 'Describe the image in detail along with its components under 150 words.Also mention the connection of components like which component is connected to which. Provide the control flow'
-                        },
-                        {
-                            'type': 'image_url',
-                            'image_url': {'url': image_data_url}
-                        }
-                    ]
-                }
-            ],
-            temperature=0.1,
-            max_completion_tokens=1000,
-            top_p=1,
-            stream=True
-        )
-        return ''.join(chunk.choices[0].delta.content or '' for chunk in completion).strip()
-    except Exception as e:
+        with span('caption', doc_id, bytes=len(image_bytes)):
+            caption = call('groq.caption', lambda: _request_caption(image_data_url), retries=CAPTION_MAX_RETRIES)
+    except ProviderError as e:
         print(f"Error captioning image: {e}")
         return ''
+    if caption:
+        get_caption_cache().set(key, caption.encode('utf-8'))
+    return caption
+
+# caption all images with bounded concurrency, ordered by (page, figure)
+def caption_images(images, max_workers: int = CAPTION_MAX_WORKERS, doc_id=None):
+    images = sorted(images, key=lambda i: (i['page'], i['figure']))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        captions = list(pool.map(lambda i: caption_bytes(i['bytes'], doc_id) if 'bytes' in i else caption_image(i['path'], doc_id), images))
+    print('Caption cache:', get_caption_cache().stats())
+
+    img_captions = []
+    for i, cap in zip(images, captions):
+        if cap:
+            img_captions.append({
+                'content': f"[Figure {i['figure']}, Page {i['page']}]: {cap}",
+                'original': i
+            })
+    return img_captions
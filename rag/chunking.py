@@ -0,0 +1,29 @@
+import re
+
+# rough tokens-per-word for English prose, close enough to size chunks without a tokenizer
+TOKENS_PER_WORD = 4 / 3
+
+
+def approx_tokens(text):
+    return int(len(text.split()) * TOKENS_PER_WORD)
+
+
+# table html as a compact text grid, one row per line, cells separated by ' | '
+def plain_text(text):
+    if '<tr' not in text.lower():
+        return text
+    rows = []
+    for row in re.split(r'</tr>', text, flags=re.IGNORECASE):
+        cells = [' '.join(re.sub(r'<[^>]+>', ' ', c).split()) for c in re.split(r'</t[dh]>', row, flags=re.IGNORECASE)]
+        cells = [c for c in cells if c]
+        if cells:
+            rows.append(' | '.join(cells))
+    return '\n'.join(rows)
+
+
+# overlapping windows of about max_tokens each, cut on word boundaries
+def child_chunks(text, max_tokens: int, overlap_tokens: int = 0):
+    words = plain_text(text).split()
+    size = max(1, int(max_tokens / TOKENS_PER_WORD))
+    step = max(1, size - int(overlap_tokens / TOKENS_PER_WORD))
+    return [' '.join(words[start:start + size]) for start in range(0, max(1, len(words) - size + step), step)]
@@ -0,0 +1,100 @@
+import re
+
+from rag.chunking import approx_tokens, plain_text
+from rag.lexical import tokenize
+
+_SENTENCE = re.compile(r'(?<=[.!?])\s+|\n+')
+_MARKER = re.compile(r'^\[(Figure|Table|Page)[^\]]*\]:?\s*')
+GAP = ' … '
+
+
+# page / figure marker kept in front of each passage so the answer can cite it
+def marker(doc):
+    meta = doc.metadata
+    page = f"Page {meta['page']}" if meta.get('page') else None
+    if meta.get('type') == 'image':
+        return f"[Figure {meta.get('figure')}, {page}]" if page else f"[Figure {meta.get('figure')}]"
+    if meta.get('type') == 'table':
+        return f"[Table, {page}]" if page else "[Table]"
+    return f"[{page}]" if page else ''
+
+
+def _units(doc):
+    text = _MARKER.sub('', doc.page_content.strip())
+    # table rows are the unit for tables, sentences for everything else
+    if doc.metadata.get('type') == 'table':
+        return [r for r in plain_text(text).split('\n') if r.strip()], True
+    return [s.strip() for s in _SENTENCE.split(text) if s.strip()], False
+
+
+# sentences scored by query-term hits, neighbours of a hit share part of its score
+def _scores(units, terms):
+    hits = [len(terms.intersection(tokenize(u))) for u in units]
+    scores = list(hits)
+    for i, h in enumerate(hits):
+        for j in (i - 1, i + 1):
+            if h and 0 <= j < len(units):
+                scores[j] += h / 2
+    return scores
+
+
+# the best-scoring units of one passage that fit in `budget` tokens, kept in document order
+def _select(units, scores, budget, is_table):
+    keep = {0} if is_table and units else set()  # a table row means little without its header
+    used = sum(approx_tokens(units[i]) for i in keep)
+    for i in sorted(range(len(units)), key=lambda i: (-scores[i], i)):
+        if i in keep:
+            continue
+        cost = approx_tokens(units[i])
+        if used + cost > budget:
+            # after a hit-bearing unit does not fit, lower ones may still fill the gap
+            continue
+        keep.add(i)
+        used += cost
+    if not keep and units:
+        # a single unit longer than the whole budget is cut at a word boundary
+        best = max(range(len(units)), key=lambda i: scores[i])
+        words = units[best].split()
+        return ' '.join(words[:max(1, int(budget / approx_tokens(units[best]) * len(words)))]) + GAP.rstrip()
+    picked = sorted(keep)
+    if is_table:
+        return '\n'.join(units[i] for i in picked)
+    parts = []
+    for n, i in enumerate(picked):
+        if n and i != picked[n - 1] + 1:
+            parts.append(GAP)
+        elif n:
+            parts.append(' ')
+        parts.append(units[i])
+    return ''.join(parts)
+
+
+# retrieved passages cut down to a token budget: overlapping sentences are dropped, tables become
+# text grids, long passages keep the sentences around query-term hits; the budget is shared in rank
+# order and what a short passage leaves unused goes to the ones after it
+def build_context(question, docs, budget: int):
+    terms = set(tokenize(question))
+    seen = set()
+    blocks = []
+    remaining = budget
+    for n, doc in enumerate(docs):
+        units, is_table = _units(doc)
+        fresh = []
+        for u in units:
+            key = ' '.join(tokenize(u)) or u
+            if key not in seen:
+                seen.add(key)
+                fresh.append(u)
+        if not fresh:
+            continue
+
+        label = marker(doc)
+        share = remaining // (len(docs) - n) - approx_tokens(label)
+        if share <= 0:
+            break
+        text = _select(fresh, _scores(fresh, terms), share, is_table)
+        if not text:
+            continue
+        remaining -= approx_tokens(text) + approx_tokens(label)
+        blocks.append(f"{label}\n{text}" if label else text)
+    return blocks
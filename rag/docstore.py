@@ -0,0 +1,78 @@
+import json
+import os
+import sqlite3
+import threading
+
+from langchain_core.documents import Document
+from langchain_core.stores import BaseStore
+
+# SQLite caps bound parameters per statement
+_BATCH = 500
+
+
+def _encode(value):
+    if isinstance(value, Document):
+        value = {'__document__': True, 'page_content': value.page_content, 'metadata': value.metadata}
+    return json.dumps(value)
+
+
+def _decode(blob):
+    value = json.loads(blob)
+    if isinstance(value, dict) and value.get('__document__'):
+        return Document(page_content=value['page_content'], metadata=value['metadata'])
+    return value
+
+
+# persistent docstore for parent sections, values live on disk not in the heap
+class SQLiteDocStore(BaseStore[str, object]):
+    def __init__(self, path: str, mmap_bytes: int = 256 * 1024 * 1024):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # reads go through the page cache via mmap instead of read() copies
+        self.conn.execute(f'PRAGMA mmap_size={int(mmap_bytes)}')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS docstore (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.conn.commit()
+
+    def mget(self, keys):
+        keys = list(keys)
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), _BATCH):
+                batch = keys[start:start + _BATCH]
+                found.update(self.conn.execute(
+                    f"SELECT key, value FROM docstore WHERE key IN ({','.join('?' * len(batch))})", batch
+                ))
+        return [_decode(found[k]) if k in found else None for k in keys]
+
+    def mset(self, key_value_pairs):
+        rows = [(k, _encode(v)) for k, v in key_value_pairs]
+        with self.lock:
+            self.conn.executemany('INSERT OR REPLACE INTO docstore VALUES (?, ?)', rows)
+            self.conn.commit()
+
+    def mdelete(self, keys):
+        with self.lock:
+            self.conn.executemany('DELETE FROM docstore WHERE key = ?', [(k,) for k in keys])
+            self.conn.commit()
+
+    # bytes stored under a key prefix, used for per-document storage accounting
+    def size(self, prefix=''):
+        with self.lock:
+            return self.conn.execute(
+                'SELECT COALESCE(SUM(LENGTH(value)), 0) FROM docstore WHERE key >= ? AND key < ?', (prefix, prefix + '\U0010ffff')
+            ).fetchone()[0]
+
+    def yield_keys(self, prefix=None):
+        with self.lock:
+            if prefix:
+                # range scan over the primary key instead of LIKE
+                keys = self.conn.execute(
+                    'SELECT key FROM docstore WHERE key >= ? AND key < ? ORDER BY key', (prefix, prefix + '\U0010ffff')
+                ).fetchall()
+            else:
+                keys = self.conn.execute('SELECT key FROM docstore ORDER BY key').fetchall()
+        for (key,) in keys:
+            yield key
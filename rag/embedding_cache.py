@@ -0,0 +1,54 @@
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.metrics import span
+from utils.providers import call
+from utils.sqlite_cache import SQLiteCache, content_key
+
+
+# caches provider embeddings on disk, keyed by model + text content
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, model: str, path: str, max_bytes: int, dtype: str = 'float16'):
+        self.embeddings = embeddings
+        self.model = model
+        self.dtype = np.dtype(dtype)
+        self.cache = SQLiteCache(path, max_bytes)
+
+    def _key(self, kind, text):
+        return content_key(self.model, kind, text)
+
+    def _encode(self, vector):
+        return np.asarray(vector, dtype=self.dtype).tobytes()
+
+    def _decode(self, blob):
+        return np.frombuffer(blob, dtype=self.dtype).astype(np.float32).tolist()
+
+    # dedupe the batch, serve hits from disk and embed only the misses;
+    # called by Chroma inside chroma_upsert, whose doc_id the span inherits
+    def embed_documents(self, texts):
+        with span('embedding', texts=len(texts)) as sizes:
+            keys = [self._key('document', t) for t in texts]
+            unique = dict(zip(keys, texts))
+            found = self.cache.get_many(unique)
+
+            missing = [k for k in unique if k not in found]
+            sizes['misses'] = len(missing)
+            if missing:
+                batch = [unique[k] for k in missing]
+                sizes['bytes'] = sum(len(t.encode('utf-8')) for t in batch)
+                vectors = call('cohere.embed_documents', lambda: self.embeddings.embed_documents(batch))
+                fresh = {k: self._encode(v) for k, v in zip(missing, vectors)}
+                self.cache.set_many(fresh)
+                found.update(fresh)
+            return [self._decode(found[k]) for k in keys]
+
+    # doc_id only labels the span, the cached vector is shared by every document
+    def embed_query(self, text, doc_id=None):
+        with span('query_embedding', doc_id, texts=1) as sizes:
+            key = self._key('query', text)
+            blob = self.cache.get(key)
+            sizes['misses'] = int(blob is None)
+            if blob is None:
+                blob = self._encode(call('cohere.embed_query', lambda: self.embeddings.embed_query(text), hedge=True))
+                self.cache.set(key, blob)
+            return self._decode(blob)
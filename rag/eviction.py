@@ -0,0 +1,101 @@
+import os
+import shutil
+import threading
+
+from rag.answer_cache import answer_cache
+from rag.lexical import delete_index, index_bytes
+from rag.rag_constants import (EVICTION_POLICY, ID_KEY, MAX_DOCS,
+                               MAX_STORAGE_BYTES)
+from rag.retriever_setup import EMBED_DIM, get_docstore, get_vectorstore
+from rag.tables import delete_tables, table_bytes
+from utils.metrics import span
+
+_lock = threading.RLock()
+
+
+def _dir_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+# files on disk owned by this record (not re-pointed to a newer upload)
+def _owned_uploads(registry, record):
+    paths = [record['path'], *record.get('aliases', [])]
+    return [p for p in paths if (registry.get_by_path(p) or {}).get('doc_id') == record['doc_id'] and os.path.exists(p)]
+
+# what a document costs in storage, broken down by where the bytes live
+def storage_cost(registry, record):
+    figures = record.get('figures_dir')
+    cost = {
+        'upload': sum(os.path.getsize(p) for p in _owned_uploads(registry, record)),
+        'figures': _dir_bytes(figures) if figures else 0,
+        'docstore': get_docstore().size(prefix=record['doc_id'] + ':'),
+        'vectors': record.get('chunks', 0) * EMBED_DIM * 4 + record.get('content_bytes', 0),
+        'lexical': index_bytes(record['doc_id']),
+        'tables': table_bytes(record['doc_id'])
+    }
+    cost['total'] = sum(cost.values())
+    return cost
+
+# count a query against a document, feeds the LRU / LFU policy
+def touch(registry, doc_id):
+    registry.touch(doc_id)
+
+def _victim(registry, keep):
+    candidates = [r for r in registry if r['doc_id'] != keep]
+    if not candidates:
+        return None
+    if EVICTION_POLICY == 'lfu':
+        return min(candidates, key=lambda r: (r.get('hits', 0), r.get('last_used', r['timestamp'])))
+    return min(candidates, key=lambda r: r.get('last_used', r['timestamp']))
+
+# remove every trace of a document: vectors, docstore keys, figures, uploads, record
+# the record is flagged first so an interrupted eviction is finished on the next run;
+# the per-document lock stops two workers from evicting the same document at once
+def evict_document(registry, record, remove_uploads=True):
+    with _lock, registry.hold(f"doc:{record['doc_id']}"):
+        record = registry.get(record['doc_id'])
+        if record is None:
+            return
+        print('Evicting', record['path'])
+        registry.update(record['doc_id'], evicting=True)
+
+        answer_cache.invalidate(record['doc_id'])
+        with span('chroma_delete', record['doc_id'], chunks=record.get('chunks', 0)):
+            get_vectorstore().delete(where={ID_KEY: record['doc_id']})
+        docstore = get_docstore()
+        docstore.mdelete(list(docstore.yield_keys(prefix=record['doc_id'] + ':')))
+        delete_index(record['doc_id'])
+        delete_tables(record['doc_id'])
+        if record.get('figures_dir'):
+            shutil.rmtree(record['figures_dir'], ignore_errors=True)
+        for p in _owned_uploads(registry, record) if remove_uploads else []:
+            os.remove(p)
+
+        registry.remove(record['doc_id'])
+
+# evict until both the document count and byte budget are met
+def enforce_budget(registry, keep=None):
+    with _lock:
+        for record in [r for r in registry if r.get('evicting')]:
+            evict_document(registry, record)
+        while True:
+            over_count = len(registry) > MAX_DOCS
+            over_bytes = sum(r.get('storage', {}).get('total', 0) for r in registry) > MAX_STORAGE_BYTES
+            victim = _victim(registry, keep) if over_count or over_bytes else None
+            if victim is None:
+                return
+            evict_document(registry, victim)
+
+def storage_report(registry):
+    return [
+        {
+            'doc_id': r['doc_id'],
+            'path': r['path'],
+            'hits': r.get('hits', 0),
+            'last_used': r.get('last_used', r['timestamp']),
+            'storage': r.get('storage') or storage_cost(registry, r)
+        }
+        for r in registry
+    ]
@@ -1,38 +1,90 @@
+import io
+import math
+import multiprocessing
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-import pymupdf4llm
-from unstructured.partition.pdf import partition_pdf
+from rag.rag_constants import (EXTRACT_MIN_PAGES, EXTRACT_WORKERS, FIGURE_DIR,
+                               FIGURE_MIN_SIDE, IMAGE_EXTRACTION_MODE,
+                               IMAGE_MAX_SIDE, SAVE_FIGURES)
+from utils.metrics import record, span
 
+_pool = None
+_pool_lock = threading.Lock()
 
-# Extract text and tables from pdf
-def extract_pdf(path):
-    # partition the pdf into elements like table, text, image etc
-    chunks = partition_pdf(
-        filename=path,
+# worker processes shared by every ingestion, spawned so threads in the server are not forked;
+# the lock keeps concurrent first ingestions from each spawning a pool
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+# split the document into contiguous page ranges, one per worker
+def _page_ranges(path):
+    # pymupdf is only imported once ingestion runs, query-only workers never load it
+    import pymupdf
+    with pymupdf.open(path) as doc:
+        pages = doc.page_count
+    size = max(EXTRACT_MIN_PAGES, math.ceil(pages / EXTRACT_WORKERS))
+    return [(start, min(start + size, pages)) for start in range(0, pages, size)]
+
+# partition one page range into elements (no chunking), runs in a worker process
+def _partition_pages(path, start, end):
+    # unstructured is heavy, like pymupdf it is only imported once ingestion actually runs
+    import pymupdf
+    from unstructured.partition.pdf import partition_pdf
+    with pymupdf.open(path) as src, pymupdf.open() as part:
+        part.insert_pdf(src, from_page=start, to_page=end - 1)
+        data = part.tobytes()
+    return partition_pdf(
+        file=io.BytesIO(data),
+        metadata_filename=path,
+        starting_page_number=start + 1,
         infer_table_structure=True,
         strategy='fast',
         extract_image_block_types=['Image'],
-        extract_image_block_to_payload=True,
-        chunking_strategy='by_title',
+        extract_image_block_to_payload=True
+    )
+
+# merge the per-range elements in page order and chunk them in one pass,
+# so title-based chunk boundaries match a single-process partition
+def _merge(futures):
+    from unstructured.chunking.title import chunk_by_title
+    elements = [el for f in futures for el in f.result()]
+    chunks = chunk_by_title(
+        elements,
         max_characters=10000,
         combine_text_under_n_chars=2000,
         new_after_n_chars=6000
     )
-    texts, tables = [], []
+    texts, tables, text_pages, table_pages = [], [], [], []
     for c in chunks:
         cls = type(c).__name__
+        # page the chunk starts on, for citations
+        page = getattr(c.metadata, 'page_number', None)
         if cls == 'CompositeElement':
             texts.append(str(c))
+            text_pages.append(page)
         elif cls == 'TableElement':
             tables.append(getattr(c.metadata, 'text_as_html', str(c)))
-    return {'texts': texts, 'tables': tables}
+            table_pages.append(page)
+    return {'texts': texts, 'tables': tables, 'text_pages': text_pages, 'table_pages': table_pages}
+
+# where a document's figure files go, keyed by doc_id so same-named uploads never share it
+def figures_dir(doc_id):
+    return os.path.join(FIGURE_DIR, doc_id)
 
 # Extract images from pdf
-def extract_images(path, out_dir: str = 'figures'):
+def extract_images(path, out_dir: str):
     # create directory for image storing
-    out_dir = os.path.join(out_dir, os.path.basename(path).replace(".pdf", ""))
     os.makedirs(out_dir, exist_ok=True)
 
+    import pymupdf4llm
+
     # using pymupdf4llm to fetch images from pdf
     pymupdf4llm.to_markdown(path, write_images=True, image_path=out_dir, image_format='png', dpi=300, page_chunks=True)
 
@@ -53,3 +105,95 @@ def extract_images(path, out_dir: str = 'figures'):
             except Exception as e:
                 print(f"Warning: Could not parse metadata from {fname}: {e}")
     return image_records
+
+# decode an embedded image stream to RGB, downscaled to fit max_side
+def _embedded_png(doc, xref, max_side):
+    import pymupdf
+    pix = pymupdf.Pixmap(doc, xref)
+    if pix.colorspace and pix.colorspace.n not in (1, 3):
+        pix = pymupdf.Pixmap(pymupdf.csRGB, pix)
+    if pix.alpha:
+        pix = pymupdf.Pixmap(pix, 0)
+    scale = max_side / max(pix.width, pix.height)
+    if scale < 1:
+        pix = pymupdf.Pixmap(pix, max(1, int(pix.width * scale)), max(1, int(pix.height * scale)), None)
+    return pix.tobytes('png')
+
+# render a vector figure region at the resolution that fits max_side
+def _region_png(page, rect, max_side):
+    import pymupdf
+    zoom = min(max_side / max(rect.width, rect.height), 300 / 72)
+    return page.get_pixmap(clip=rect, matrix=pymupdf.Matrix(zoom, zoom)).tobytes('png')
+
+# pull embedded images and vector figure regions straight from the pdf as in-memory pngs
+def extract_embedded_images(path, out_dir: str = None, max_side: int = IMAGE_MAX_SIDE):
+    stem = os.path.basename(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    import pymupdf
+    image_records = []
+    with pymupdf.open(path) as doc:
+        for page in doc:
+            found = []
+            image_rects = []
+            for xref in dict.fromkeys(info[0] for info in page.get_images(full=True)):
+                rects = [r for r in page.get_image_rects(xref) if min(r.width, r.height) >= FIGURE_MIN_SIDE]
+                if not rects:
+                    continue
+                image_rects.extend(rects)
+                found.append((rects[0], lambda xref=xref: _embedded_png(doc, xref, max_side)))
+
+            # ruled tables are drawings too, but they are already ingested as tables
+            table_rects = [pymupdf.Rect(t.bbox) for t in page.find_tables().tables]
+
+            # vector drawings (plots, diagrams) that are not just the frame of an embedded image or a table
+            for rect in page.cluster_drawings():
+                if min(rect.width, rect.height) < FIGURE_MIN_SIDE:
+                    continue
+                if any(rect.intersects(r) for r in image_rects + table_rects):
+                    continue
+                found.append((rect, lambda rect=rect, page=page: _region_png(page, rect, max_side)))
+
+            # number figures in reading order, same file naming as pymupdf4llm
+            found.sort(key=lambda f: (f[0].y0, f[0].x0))
+            for index, (rect, render) in enumerate(found):
+                fname = f"{stem}-{page.number}-{index}.png"
+                try:
+                    record = {
+                        'bytes': render(),
+                        'page': page.number + 1,
+                        'figure': index + 1,
+                        'filename': fname
+                    }
+                except Exception as e:
+                    print(f"Warning: Could not extract {fname}: {e}")
+                    continue
+                if out_dir:
+                    record['path'] = os.path.join(out_dir, fname)
+                    with open(record['path'], 'wb') as f:
+                        f.write(record['bytes'])
+                image_records.append(record)
+    return image_records
+
+# text/tables and images extracted concurrently on the same worker pool
+def extract_document(path, doc_id):
+    pool = _get_pool()
+    start = time.perf_counter()
+    if IMAGE_EXTRACTION_MODE == 'markdown':
+        images = pool.submit(extract_images, path, figures_dir(doc_id))
+    else:
+        images = pool.submit(extract_embedded_images, path, figures_dir(doc_id) if SAVE_FIGURES else None)
+
+    # images finish in a worker while partitioning goes on, so the span ends when the result lands
+    def _done(future):
+        failed = future.exception() is not None
+        record('image_extraction', time.perf_counter() - start, doc_id, 'error' if failed else 'ok',
+               images=0 if failed else len(future.result()))
+    images.add_done_callback(_done)
+
+    with span('partition', doc_id) as sizes:
+        ranges = _page_ranges(path)
+        data = _merge([pool.submit(_partition_pages, path, s, e) for s, e in ranges])
+        sizes.update(pages=ranges[-1][1] if ranges else 0, chunks=len(data['texts']) + len(data['tables']))
+    return data, images.result()
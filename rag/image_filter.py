@@ -0,0 +1,75 @@
+import numpy as np
+
+from rag.rag_constants import (IMAGE_DUP_HAMMING, IMAGE_MAX_ASPECT,
+                               IMAGE_MIN_ENTROPY, IMAGE_MIN_SIDE_PX)
+
+
+def _image_bytes(record):
+    if 'bytes' in record:
+        return record['bytes']
+    with open(record['path'], 'rb') as f:
+        return f.read()
+
+# grayscale pixels of the image resized to width x height
+def _gray(pix, width, height):
+    import pymupdf
+    small = pymupdf.Pixmap(pix, width, height, None)
+    return np.frombuffer(small.samples, dtype=np.uint8).reshape(height, width)
+
+# shannon entropy (bits) of the grayscale histogram, near 0 for blank or flat images
+def _entropy(pixels):
+    counts = np.bincount(pixels.ravel(), minlength=256)
+    p = counts[counts > 0] / pixels.size
+    return float(-(p * np.log2(p)).sum())
+
+# 64-bit difference hash, close for visually similar images
+def _dhash(pix):
+    pixels = _gray(pix, 9, 8).astype(np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int(''.join('1' if b else '0' for b in bits), 2)
+
+def _describe(record):
+    # pymupdf is only needed at ingestion, query-only workers never load it
+    import pymupdf
+    pix = pymupdf.Pixmap(_image_bytes(record))
+    if pix.alpha:
+        pix = pymupdf.Pixmap(pix, 0)
+    if pix.n != 1:
+        pix = pymupdf.Pixmap(pymupdf.csGRAY, pix)
+    return pix
+
+# drop trivial images and collapse near-duplicates to one representative each
+def filter_images(images):
+    kept, hashes = [], []
+    stats = {'total': len(images), 'trivial': 0, 'duplicates': 0}
+    for record in sorted(images, key=lambda i: (i['page'], i['figure'])):
+        try:
+            pix = _describe(record)
+        except Exception as e:
+            print(f"Warning: Could not decode {record['filename']}: {e}")
+            stats['trivial'] += 1
+            continue
+
+        # tiny icons, rules / separators and near-blank decorations
+        short, long = sorted((pix.width, pix.height))
+        if short < IMAGE_MIN_SIDE_PX or long / short > IMAGE_MAX_ASPECT:
+            stats['trivial'] += 1
+            continue
+        if _entropy(_gray(pix, min(pix.width, 64), min(pix.height, 64))) < IMAGE_MIN_ENTROPY:
+            stats['trivial'] += 1
+            continue
+
+        h = _dhash(pix)
+        match = next((i for i, other in enumerate(hashes) if (h ^ other).bit_count() <= IMAGE_DUP_HAMMING), None)
+        if match is not None:
+            kept[match].setdefault('duplicates', []).append(
+                {'page': record['page'], 'figure': record['figure'], 'filename': record['filename']}
+            )
+            stats['duplicates'] += 1
+            continue
+        kept.append(record)
+        hashes.append(h)
+
+    stats['kept'] = len(kept)
+    stats['saved_calls'] = stats['trivial'] + stats['duplicates']
+    return kept, stats
@@ -0,0 +1,109 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+from langchain_core.documents import Document
+
+from rag.rag_constants import LEXICAL_DIR
+
+_TAG = re.compile(r'<[^>]+>')
+# keeps identifiers, versions and numbers like 3.5, v1.2-beta or 10,000 as single tokens
+_TOKEN = re.compile(r'[a-z0-9_]+(?:[.,\-/][a-z0-9_]+)*')
+_STOPWORDS = frozenset(
+    'a an and are as at be by can do does for from how in is it of on or so that the this to was what when where which who why with'.split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(_TAG.sub(' ', text).lower()) if t not in _STOPWORDS]
+
+
+# in-process inverted index with BM25 scoring over one document's chunks
+class BM25Index:
+    def __init__(self, chunks, k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(chunk index, term frequency)]
+        self.lengths = []
+        for i, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk['text']))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((i, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def search(self, terms, k):
+        n = len(self.chunks)
+        scores = defaultdict(float)
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda s: s[1], reverse=True)[:k]
+        return [
+            (Document(id=self.chunks[i]['id'], page_content=self.chunks[i]['text'], metadata=self.chunks[i]['metadata']), score)
+            for i, score in best
+        ]
+
+
+_loaded = OrderedDict()
+_lock = threading.Lock()
+_MAX_LOADED = 16
+
+
+def _index_path(doc_id):
+    return os.path.join(LEXICAL_DIR, f"{doc_id}.json")
+
+# persist the chunks of a document, the postings are rebuilt on load
+def build_index(doc_id, chunks):
+    os.makedirs(LEXICAL_DIR, exist_ok=True)
+    with open(_index_path(doc_id), 'w') as f:
+        json.dump(chunks, f)
+    with _lock:
+        _loaded[doc_id] = BM25Index(chunks)
+        while len(_loaded) > _MAX_LOADED:
+            _loaded.popitem(last=False)
+
+def get_index(doc_id):
+    with _lock:
+        if doc_id in _loaded:
+            _loaded.move_to_end(doc_id)
+            return _loaded[doc_id]
+    if not os.path.exists(_index_path(doc_id)):
+        return None
+    with open(_index_path(doc_id)) as f:
+        index = BM25Index(json.load(f))
+    with _lock:
+        _loaded[doc_id] = index
+        while len(_loaded) > _MAX_LOADED:
+            _loaded.popitem(last=False)
+    return index
+
+def delete_index(doc_id):
+    with _lock:
+        _loaded.pop(doc_id, None)
+    if os.path.exists(_index_path(doc_id)):
+        os.remove(_index_path(doc_id))
+
+def index_bytes(doc_id):
+    path = _index_path(doc_id)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+# reciprocal rank fusion of several ranked lists of documents
+def rrf(ranked_lists, k, c: int = 60):
+    scores = defaultdict(float)
+    docs = {}
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked):
+            key = doc.id or doc.page_content
+            scores[key] += 1 / (c + rank + 1)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
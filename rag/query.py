@@ -0,0 +1,233 @@
+import contextvars
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+from rag.answer_cache import answer_cache
+from rag.context import build_context
+from rag.lexical import get_index, rrf, tokenize
+from rag.rag_constants import (CHILD_FETCH_K, CONTEXT_TOKEN_BUDGET,
+                               HYBRID_FETCH_K, ID_KEY,
+                               INDEX_MODE, LEXICAL_FASTPATH_MAX_TERMS,
+                               MMR_LAMBDA, PARENT_KEY, RERANK, RERANK_POOL,
+                               SPECULATE_MIN_WORDS, TABLE_LOOKUP_ROWS)
+from rag.rerank import mmr, rerank
+from rag.retriever_setup import (get_docstore, get_embedding_function,
+                                 get_vectorstore)
+from rag.tables import load_tables, lookup
+from utils.gemini import answer_with_gemini, stream_answer_with_gemini
+from utils.metrics import span
+
+
+PARENT_CHILD = INDEX_MODE == 'parent_child'
+# children per parent vary, so fetch enough of them for k distinct parents
+FETCH_K = CHILD_FETCH_K if PARENT_CHILD else HYBRID_FETCH_K
+
+
+# ranked children -> their parent sections from the docstore, deduplicated in rank order,
+# the PARENT_KEY -> docstore mapping of a MultiVectorRetriever, applied after hybrid search and MMR;
+# chunks indexed before parent/child mode have no stored parent and stand for themselves
+def parents_of(children):
+    first = {}
+    for child in children:
+        first.setdefault(child.metadata.get(PARENT_KEY) or child.id, child)
+    parent_ids = list(first)
+    parents = []
+    for parent_id, parent in zip(parent_ids, get_docstore().mget(parent_ids)):
+        if isinstance(parent, Document):
+            parent.id = parent_id
+        else:
+            parent = first[parent_id]
+        parents.append(parent)
+    return parents
+
+_QUESTION_WORDS = frozenset('what who whom whose when where which why how is are was were do does did can could should would will explain describe'.split())
+_ACRONYM = re.compile(r'\b[A-Z][A-Z0-9]{1,}\b')
+
+# keyword-style input rather than a spoken question: no question word or '?', and at least one
+# identifier, number or acronym (e.g. "ISO-9001", "v2.1 release", "USB pinout")
+def is_keyword_query(question, terms):
+    if '?' in question or _QUESTION_WORDS.intersection(re.findall(r"[a-z']+", question.lower())):
+        return False
+    return bool(_ACRONYM.search(question)) or any(any(c.isdigit() or c in '_.-/' for c in t) for t in terms)
+
+# short keyword queries with a lexical match never need an embedding call;
+# questions, however short, go through vector search, rerank and the semantic answer cache
+def lexical_fast_path(question, doc_id, k=3):
+    terms = tokenize(question)
+    if not terms or len(terms) > LEXICAL_FASTPATH_MAX_TERMS or not is_keyword_query(question, terms):
+        return None
+    index = get_index(doc_id)
+    if not index:
+        return None
+    with span('lexical_search', doc_id, terms=len(terms)) as sizes:
+        hits = index.search(terms, FETCH_K if PARENT_CHILD else k)
+        sizes['results'] = len(hits)
+    if not hits:
+        return None
+    return parents_of([doc for doc, _ in hits])[:k]
+
+# over-fetch nearest chunks together with their stored embeddings
+def _vector_candidates(vector, doc_id, n):
+    with span('similarity_search', doc_id) as sizes:
+        res = get_vectorstore()._collection.query(
+            query_embeddings=[vector], n_results=n, where={ID_KEY: doc_id},
+            include=['documents', 'metadatas', 'embeddings']
+        )
+        sizes['results'] = len(res['ids'][0])
+    ids = res['ids'][0]
+    docs = [Document(id=i, page_content=t, metadata=m) for i, t, m in zip(ids, res['documents'][0], res['metadatas'][0])]
+    return docs, dict(zip(ids, res['embeddings'][0]))
+
+# vector and BM25 candidates fused by reciprocal rank, diversified with MMR, then reranked locally
+def retrieve(question, vector, doc_id, k=3):
+    candidates, embeddings = _vector_candidates(vector, doc_id, FETCH_K)
+    index = get_index(doc_id)
+    if index:
+        with span('lexical_search', doc_id):
+            lexical_docs = [doc for doc, _ in index.search(tokenize(question), FETCH_K)]
+        candidates = rrf([candidates, lexical_docs], FETCH_K)
+        # lexical-only hits: their vectors are read from the local store, not re-embedded
+        missing = [d.id for d in candidates if d.id not in embeddings]
+        if missing:
+            stored = get_vectorstore().get(ids=missing, include=['embeddings'])
+            embeddings.update(zip(stored['ids'], stored['embeddings']))
+        candidates = [d for d in candidates if d.id in embeddings]
+
+    pool = k * RERANK_POOL if RERANK else k
+    if PARENT_CHILD:
+        # diversify over every child, then keep the first `pool` distinct parent sections
+        picked = mmr(vector, [embeddings[d.id] for d in candidates], len(candidates), MMR_LAMBDA)
+        docs = parents_of([candidates[i] for i in picked])[:pool]
+    else:
+        picked = mmr(vector, [embeddings[d.id] for d in candidates], pool, MMR_LAMBDA)
+        docs = [candidates[i] for i in picked]
+    if RERANK:
+        with span('rerank', doc_id, candidates=len(docs)):
+            docs = rerank(question, docs)
+    return docs[:k]
+
+# page / figure citation for a retrieved chunk
+def citation(doc):
+    meta = doc.metadata
+    if meta.get('type') == 'image':
+        return {'type': 'image', 'page': meta.get('page'), 'figure': meta.get('figure')}
+    return {'type': meta.get('type', 'text'), 'page': meta.get('page')}
+
+# retrieved table passages answered from the table store: the rows matching the question and
+# any aggregate it asks for, computed over the whole table rather than the retrieved row group;
+# later passages of a table already answered are dropped
+def _table_rows(question, doc_id, docs):
+    if not any(d.metadata.get('table') is not None for d in docs):
+        return docs
+    with span('table_lookup', doc_id) as sizes:
+        tables = load_tables(doc_id)
+        answered = set()
+        out = []
+        for doc in docs:
+            index = doc.metadata.get('table')
+            if index is None or index not in tables:
+                out.append(doc)
+                continue
+            if index in answered:
+                continue
+            answered.add(index)
+            rows = lookup(tables[index], question, TABLE_LOOKUP_ROWS)
+            if rows is None:
+                out.append(doc)
+                continue
+            out.append(Document(id=doc.id, page_content=rows, metadata={**doc.metadata, 'rows': 'lookup'}))
+        sizes['tables'] = len(answered)
+    return out
+
+# cached answer, or the chunks to answer from and the question vector (None on the lexical fast path,
+# where only an identical earlier query is answered from the cache)
+def _prepare(question, doc_id, k):
+    docs = lexical_fast_path(question, doc_id, k)
+    if docs is not None:
+        hit = answer_cache.get(doc_id, question)
+        if hit:
+            return hit, None, None
+        return None, _table_rows(question, doc_id, docs), None
+    vector = get_embedding_function().embed_query(question, doc_id=doc_id)
+    hit = answer_cache.lookup(doc_id, vector)
+    if hit:
+        return hit, None, vector
+    return None, _table_rows(question, doc_id, retrieve(question, vector, doc_id, k)), vector
+
+_speculation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='speculate')
+
+
+# casing and punctuation differ between partial and formatted turns
+def _normalize(text):
+    return ' '.join(re.findall(r"[a-z0-9']+", text.lower()))
+
+
+# starts embedding + retrieval on partial transcripts so the work is done when the final turn arrives
+class Speculation:
+    def __init__(self, doc_id, k=3):
+        self.doc_id = doc_id
+        self.k = k
+        self.futures = {}
+        self.last = None
+        self.lock = threading.Lock()
+        # partials arrive on the STT socket thread, spans should still land in the request's timings
+        self.context = contextvars.copy_context()
+
+    # speculate only on text that held across two partials, or on the end of the turn
+    def on_partial(self, text, end_of_turn=False):
+        key = _normalize(text)
+        stable = key == self.last or end_of_turn
+        self.last = key
+        if not stable or len(key.split()) < SPECULATE_MIN_WORDS:
+            return
+        with self.lock:
+            if key not in self.futures:
+                self.futures[key] = _speculation_pool.submit(self.context.copy().run, _prepare, text, self.doc_id, self.k)
+
+    # prepared retrieval for the final question, if a speculation matched it
+    def take(self, question):
+        with self.lock:
+            future = self.futures.get(_normalize(question))
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Speculative retrieval failed: {e}")
+            return None
+
+
+# answer a question against one document, reusing answers to near-identical questions
+def answer_question(question, doc_id, k=3, prepared=None):
+    hit, docs, vector = prepared or _prepare(question, doc_id, k)
+    if hit:
+        return {'answer': hit['answer'], 'context': hit['context'], 'citations': hit['citations'], 'cached': True}
+
+    context = build_context(question, docs, CONTEXT_TOKEN_BUDGET)
+    citations = [citation(doc) for doc in docs]
+    answer = answer_with_gemini(question, context, doc_id)
+    answer_cache.store(doc_id, question, vector, answer, context, citations)
+    return {'answer': answer, 'context': context, 'citations': citations, 'cached': False}
+
+# same as answer_question, but yields (event, data) pairs: the context first, then answer tokens
+def stream_answer(question, doc_id, k=3, prepared=None):
+    hit, docs, vector = prepared or _prepare(question, doc_id, k)
+    if hit:
+        yield 'context', {'context': hit['context'], 'citations': hit['citations'], 'cached': True}
+        yield 'token', hit['answer']
+        yield 'done', {'cached': True}
+        return
+
+    context = build_context(question, docs, CONTEXT_TOKEN_BUDGET)
+    citations = [citation(doc) for doc in docs]
+    yield 'context', {'context': context, 'citations': citations, 'cached': False}
+    parts = []
+    for token in stream_answer_with_gemini(question, context, doc_id):
+        parts.append(token)
+        yield 'token', token
+    answer = ''.join(parts).strip()
+    answer_cache.store(doc_id, question, vector, answer, context, citations)
+    yield 'done', {'cached': False}
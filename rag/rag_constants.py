@@ -10,8 +10,96 @@ GEMINI_IMAGE_API_KEY = os.getenv("GEMINI_IMAGE_API_KEY")
 
 COLLECTION_NAME = 'multi_modal_rag'
 ID_KEY = 'doc_id'
-PROCESSED_FILE = 'processed.json'
+PARENT_KEY = 'parent_id'  # vector metadata key pointing at the docstore section it was cut from
+PROCESSED_FILE = 'processed.json'  # legacy JSON registry, migrated into REGISTRY_FILE on first start
 MAX_DOCS = 5
 
-assert GROQ_API_KEY, 'Set GROQ_API_KEY in .env'
-assert COHERE_API_KEY, 'Set COHERE_API_KEY in .env'
\ No newline at end of file
+# storage budget across vectors, docstore, figures and uploads; victims picked by 'lru' or 'lfu'
+MAX_STORAGE_BYTES = int(os.getenv("MAX_STORAGE_BYTES", 2 * 1024 * 1024 * 1024))
+EVICTION_POLICY = os.getenv("EVICTION_POLICY", 'lru')
+
+# image captioning concurrency and provider quota
+CAPTION_MAX_WORKERS = int(os.getenv("CAPTION_MAX_WORKERS", 4))
+CAPTION_RATE_PER_SEC = float(os.getenv("CAPTION_RATE_PER_SEC", 0.5))
+CAPTION_BURST = int(os.getenv("CAPTION_BURST", 2))
+CAPTION_MAX_RETRIES = int(os.getenv("CAPTION_MAX_RETRIES", 3))
+
+# persistent caption cache keyed by image bytes + model + prompt
+CAPTION_CACHE_FILE = os.getenv("CAPTION_CACHE_FILE", 'cache/captions.sqlite')
+CAPTION_CACHE_MAX_BYTES = int(os.getenv("CAPTION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# persistent embedding cache in front of Cohere, vectors stored as float16
+EMBED_CACHE_FILE = os.getenv("EMBED_CACHE_FILE", 'cache/embeddings.sqlite')
+EMBED_CACHE_MAX_BYTES = int(os.getenv("EMBED_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+EMBED_CACHE_DTYPE = os.getenv("EMBED_CACHE_DTYPE", 'float16')
+
+# original texts, tables and figure records behind the vectors
+DOCSTORE_FILE = os.getenv("DOCSTORE_FILE", 'docstore.sqlite')
+
+# semantic answer cache: cosine similarity threshold, seconds to live, entries per document
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.92))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 3600))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 256))
+
+# hybrid retrieval: per-document BM25 indexes, candidates fetched per retriever before fusion,
+# and questions of at most LEXICAL_FASTPATH_MAX_TERMS keywords answered from BM25 alone
+LEXICAL_DIR = os.getenv("LEXICAL_DIR", 'lexical_index')
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", 10))
+LEXICAL_FASTPATH_MAX_TERMS = int(os.getenv("LEXICAL_FASTPATH_MAX_TERMS", 3))
+
+# 'parent_child' embeds small child chunks and answers from their parent sections, 'flat' embeds whole sections;
+# CHILD_FETCH_K children are fetched per retriever so enough distinct parents survive deduplication
+INDEX_MODE = os.getenv("INDEX_MODE", 'parent_child')
+CHILD_CHUNK_TOKENS = int(os.getenv("CHILD_CHUNK_TOKENS", 128))
+CHILD_CHUNK_OVERLAP = int(os.getenv("CHILD_CHUNK_OVERLAP", 16))
+CHILD_FETCH_K = int(os.getenv("CHILD_FETCH_K", 30))
+
+# post-retrieval diversification (MMR lambda: 1 = pure relevance) and optional local reranking
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.6))
+RERANK = os.getenv("RERANK", 'true').lower() == 'true'
+RERANK_POOL = int(os.getenv("RERANK_POOL", 2))
+
+# parsed tables: array-backed store per document, rows per embedded row group, rows returned by a lookup
+TABLE_DIR = os.getenv("TABLE_DIR", 'table_store')
+TABLE_ROW_GROUP = int(os.getenv("TABLE_ROW_GROUP", 8))
+TABLE_LOOKUP_ROWS = int(os.getenv("TABLE_LOOKUP_ROWS", 8))
+
+# tokens of retrieved context sent to the LLM per question
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+
+# partial transcripts shorter than this are not worth a speculative retrieval
+SPECULATE_MIN_WORDS = int(os.getenv("SPECULATE_MIN_WORDS", 3))
+
+# background ingestion workers behind /upload
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+
+# registry, jobs and per-client state shared by every worker process; live locks and jobs are
+# refreshed by a heartbeat every INGEST_LOCK_TTL / 4 seconds, so those of a killed or reloaded
+# process are taken over after INGEST_LOCK_TTL
+REGISTRY_FILE = os.getenv("REGISTRY_FILE", 'registry.sqlite')
+INGEST_LOCK_TTL = float(os.getenv("INGEST_LOCK_TTL", 60))
+
+# page-parallel PDF extraction, documents shorter than EXTRACT_MIN_PAGES per worker are not split further
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", os.cpu_count() or 2))
+EXTRACT_MIN_PAGES = int(os.getenv("EXTRACT_MIN_PAGES", 4))
+
+# figures are pulled straight from the PDF ('embedded') or via full markdown rendering ('markdown')
+IMAGE_EXTRACTION_MODE = os.getenv("IMAGE_EXTRACTION_MODE", 'embedded')
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", 1120))
+FIGURE_MIN_SIDE = int(os.getenv("FIGURE_MIN_SIDE", 72))
+SAVE_FIGURES = os.getenv("SAVE_FIGURES", 'false').lower() == 'true'
+# figure files of each document go under FIGURE_DIR/<doc_id>
+FIGURE_DIR = os.getenv("FIGURE_DIR", 'figures')
+
+# images skipped before captioning: tiny, rule-shaped, flat, or near-duplicate (dHash distance)
+IMAGE_MIN_SIDE_PX = int(os.getenv("IMAGE_MIN_SIDE_PX", 48))
+IMAGE_MAX_ASPECT = float(os.getenv("IMAGE_MAX_ASPECT", 12))
+IMAGE_MIN_ENTROPY = float(os.getenv("IMAGE_MIN_ENTROPY", 2.0))
+IMAGE_DUP_HAMMING = int(os.getenv("IMAGE_DUP_HAMMING", 6))
+
+# uploads are streamed to disk in chunks and rejected past this size
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 1024 * 1024))
+# longest recorded question accepted by /transcribe/audio
+MAX_CLIP_SECONDS = int(os.getenv("MAX_CLIP_SECONDS", 60))
+
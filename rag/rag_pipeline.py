@@ -1,61 +1,154 @@
-import json
-import os
+import threading
 import time
 import uuid
 
-from langchain.schema import Document
+from langchain_core.documents import Document
 
-from rag.captioning import caption_image
-from rag.extractors import extract_images, extract_pdf
-from rag.rag_constants import ID_KEY, MAX_DOCS, PROCESSED_FILE
-from rag.retriever_setup import docstore, vectorstore
+from rag.captioning import caption_images
+from rag.chunking import child_chunks
+from rag.eviction import enforce_budget, evict_document, storage_cost
+from rag.extractors import extract_document, figures_dir
+from rag.image_filter import filter_images
+from rag.lexical import build_index
+from rag.rag_constants import (CHILD_CHUNK_OVERLAP, CHILD_CHUNK_TOKENS, ID_KEY,
+                               INDEX_MODE, INGEST_LOCK_TTL, PARENT_KEY,
+                               PROCESSED_FILE, REGISTRY_FILE, TABLE_ROW_GROUP)
+from rag.registry import IngestionRegistry, file_sha256
+from rag.retriever_setup import get_docstore, get_vectorstore
+from rag.tables import Table, parse_table, save_tables
+from utils.metrics import span
 
-if os.path.exists(PROCESSED_FILE):
-    records = json.load(open(PROCESSED_FILE))
-else:
-    records = []
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+# ingestion records shared through SQLite, opened on first use; the legacy JSON file is migrated once
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = IngestionRegistry(REGISTRY_FILE, legacy_path=PROCESSED_FILE, lock_ttl=INGEST_LOCK_TTL)
+        return _registry
+
+
+# vectors embedded for one parent section: small overlapping children, or the section itself in flat mode
+def _children(parent):
+    # table summaries and row groups are already small
+    if INDEX_MODE != 'parent_child' or 'rows' in parent.metadata:
+        return [Document(id=parent.id, page_content=parent.page_content, metadata={**parent.metadata, PARENT_KEY: parent.id})]
+    texts = [t for t in child_chunks(parent.page_content, CHILD_CHUNK_TOKENS, CHILD_CHUNK_OVERLAP) if t]
+    return [
+        Document(id=f"{parent.id}#{n}", page_content=text, metadata={**parent.metadata, PARENT_KEY: parent.id})
+        for n, text in enumerate(texts)
+    ]
+
+# a parsed table is indexed as a schema summary plus small row groups, never as one html blob;
+# tables that could not be parsed keep their html
+def _table_parents(table, index, doc_id, page):
+    meta = {ID_KEY: doc_id, 'type': 'table'}
+    if page is not None:
+        meta['page'] = page
+    if not isinstance(table, Table):
+        return [Document(page_content=table, metadata=meta)]
+    meta['table'] = index
+    return [Document(page_content=table.summary(index), metadata={**meta, 'rows': 'schema'})] + [
+        Document(page_content=table.grid(range(start, end)), metadata={**meta, 'rows': f"{start + 1}-{end}"})
+        for start, end in table.row_groups(TABLE_ROW_GROUP)
+    ]
 
 # add the documents in the vector store
-def upsert_list(contents, originals, kind, doc_id):
-    # get all the ids, if image then store with citations othewise for text store directly
-    ids = [str(uuid.uuid4()) for _ in contents]
+def upsert_list(contents, kind, doc_id, pages=None):
+    # if image then store with citations othewise for text store directly
     if kind == 'image':
-        docs = [Document(
+        parents = [Document(
             page_content=item['content'],
-            metadata={ID_KEY: doc_id, 'type': kind, 'page': item['original']['page'], 'figure': item['original']['figure'], 'filename': item['original']['filename']}
+            metadata={ID_KEY: doc_id, 'type': kind, 'page': item['original']['page'], 'figure': item['original']['figure'], 'filename': item['original']['filename'],
+                      'also_on_pages': ','.join(str(d['page']) for d in item['original'].get('duplicates', []))}
         ) for item in contents]
+    elif kind == 'table':
+        pages = pages or [None] * len(contents)
+        parents = [p for index, (table, page) in enumerate(zip(contents, pages)) for p in _table_parents(table, index, doc_id, page)]
     else:
-        docs = [Document(page_content=content, metadata={ID_KEY: doc_id, 'type': kind}) for content in contents]
-    vectorstore.add_documents(docs)
-    docstore.mset(list(zip(ids, originals)))
+        parents = [Document(page_content=content, metadata={ID_KEY: doc_id, 'type': kind}) for content in contents]
+        for parent, page in zip(parents, pages or []):
+            if page is not None:
+                parent.metadata['page'] = page
+    # docstore keys are prefixed with the doc_id so a document can be removed as a unit
+    for parent in parents:
+        parent.id = f"{doc_id}:{uuid.uuid4()}"
+
+    # parent sections go to the docstore whole, only the children are embedded and searched;
+    # children carry the parent id under PARENT_KEY, query.parents_of maps them back
+    children = [child for parent in parents for child in _children(parent)]
+    # includes embedding the chunks, which has its own nested span
+    with span('chroma_upsert', doc_id, chunks=len(children), bytes=sum(len(d.page_content.encode('utf-8')) for d in children)):
+        get_vectorstore().add_documents(children, ids=[c.id for c in children])
+        get_docstore().mset([(p.id, p) for p in parents])
+    return children
 
 # the main RAG pipeline to extraction , summarize and store content
-def process(path):
+# one worker ingests a given content at a time, the others wait on its lock and reuse the record
+def process(path, sha256=None, progress=None):
+    progress = progress or (lambda stage: None)
+    sha256 = sha256 or file_sha256(path)
+    registry = get_registry()
+
+    with registry.hold(f"ingest:{sha256}"):
+        # identical content was already ingested, possibly under another name
+        existing = registry.get_by_hash(sha256)
+        if existing:
+            registry.add_alias(existing, path)
+            print('Already processed:', path)
+            return registry.get(existing['doc_id'])
+
+        return _ingest(registry, path, sha256, progress)
+
+
+def _ingest(registry, path, sha256, progress):
+    # same name but changed content replaces the stale version
+    stale = registry.get_by_path(path)
+    if stale and stale['path'] == path and not stale.get('aliases'):
+        evict_document(registry, stale, remove_uploads=False)
+
     doc_id = str(uuid.uuid4())
     print('Processing', path)
-    data = extract_pdf(path)
-    imgs = extract_images(path)
-
-    img_captions = []
-    for i in imgs:
-        cap = caption_image(i['path'])
-        if cap:
-            img_captions.append({
-                'content': f"[Figure {i['figure']}, Page {i['page']}]: {cap}",
-                'original': i
-            })
-
-    if data['texts']:
-        upsert_list(data['texts'], data['texts'], 'text', doc_id)
-    if data['tables']:
-        upsert_list(data['tables'], data['tables'], 'table', doc_id)
-    if img_captions:
-        upsert_list(img_captions, imgs, 'image', doc_id)
-
-    records.append({'path': path, 'doc_id': doc_id, 'timestamp': time.time()})
-    if len(records) > MAX_DOCS:
-        oldest = min(records, key=lambda r: r['timestamp'])
-        vectorstore.delete(filter={ID_KEY: oldest['doc_id']})
-        records.remove(oldest)
-    json.dump(records, open(PROCESSED_FILE, 'w'), indent=2)
+    progress('extracting')
+    data, imgs = extract_document(path, doc_id)
+
+    progress('captioning')
+    imgs, image_stats = filter_images(imgs)
+    print(f"Image filter: {image_stats['kept']} of {image_stats['total']} kept, {image_stats['saved_calls']} caption calls saved")
+    img_captions = caption_images(imgs, doc_id=doc_id)
+
+    # tables are parsed into columns once and kept in the array-backed table store
+    table_pages = data.get('table_pages') or [None] * len(data['tables'])
+    tables = [parse_table(html, page) or html for html, page in zip(data['tables'], table_pages)]
+    save_tables(doc_id, {i: t for i, t in enumerate(tables) if isinstance(t, Table)})
+
+    progress('embedding')
+    indexed = []
+    for contents, kind, pages in [
+        (data['texts'], 'text', data.get('text_pages')),
+        (tables, 'table', table_pages),
+        (img_captions, 'image', None)
+    ]:
+        if contents:
+            indexed += upsert_list(contents, kind, doc_id, pages)
+
+    # local BM25 index over the same chunks, for exact terms and keyword-only queries
+    with span('lexical_index', doc_id, chunks=len(indexed)):
+        build_index(doc_id, [{'id': d.id, 'text': d.page_content, 'metadata': d.metadata} for d in indexed])
+
+    record = {
+        'path': path, 'doc_id': doc_id, 'sha256': sha256, 'timestamp': time.time(), 'images': image_stats,
+        'chunks': len(indexed), 'tables': sum(isinstance(t, Table) for t in tables), 'content_bytes': sum(len(d.page_content.encode('utf-8')) for d in indexed),
+        # recorded even when every figure was filtered out, eviction removes whatever was written
+        'figures_dir': figures_dir(doc_id)
+    }
+    registry.add(record)
+    record['storage'] = storage_cost(registry, record)
+    registry.update(doc_id, storage=record['storage'])
+    enforce_budget(registry, keep=doc_id)
     print('Completed:', path)
+    return record
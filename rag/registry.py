@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+
+
+# streaming SHA-256 of a file, constant memory regardless of size
+def file_sha256(path, chunk_size: int = 1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+# connection shared by the threads of one process; every worker process opens its own,
+# WAL lets them read while one writes and busy_timeout queues concurrent writers
+def connect(path: str):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+# call beat every interval seconds on a daemon thread for the life of the process,
+# so rows marked live keep being refreshed while this process runs, however long the work takes
+def heartbeat(beat, interval: float):
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                beat()
+            except Exception:
+                traceback.print_exc()
+    threading.Thread(target=loop, daemon=True, name='heartbeat').start()
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY, sha256 TEXT, timestamp REAL NOT NULL, data TEXT NOT NULL);
+CREATE UNIQUE INDEX IF NOT EXISTS documents_sha256 ON documents (sha256);
+CREATE INDEX IF NOT EXISTS documents_timestamp ON documents (timestamp);
+CREATE TABLE IF NOT EXISTS paths (path TEXT PRIMARY KEY, doc_id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS paths_doc_id ON paths (doc_id);
+CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, acquired REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS current_documents (client_id TEXT PRIMARY KEY, path TEXT NOT NULL, updated REAL NOT NULL);
+'''
+
+
+# ingested documents keyed by content hash, with path and doc_id indexes,
+# kept in SQLite so every worker process sees the same records
+class IngestionRegistry:
+    def __init__(self, path: str, legacy_path: str = None, lock_ttl: float = 1800):
+        self.path = path
+        self.lock_ttl = lock_ttl
+        self.lock = threading.Lock()
+        self.conn = connect(path)
+        with self.lock:
+            self.conn.executescript(_SCHEMA)
+        # locks held by this process, name -> owner
+        self._held = {}
+        heartbeat(self._beat, lock_ttl / 4)
+        if legacy_path and os.path.exists(legacy_path):
+            self._migrate(legacy_path)
+
+    # one-time import of the old JSON registry, renamed afterwards so it is never read again
+    def _migrate(self, legacy_path):
+        with open(legacy_path) as f:
+            loaded = json.load(f)
+        for record in sorted(loaded, key=lambda r: r['timestamp']):
+            # records written before content hashing get hashed on load
+            if not record.get('sha256') and os.path.exists(record['path']):
+                record['sha256'] = file_sha256(record['path'])
+            if not self.get(record['doc_id']):
+                self.add(record)
+        os.replace(legacy_path, legacy_path + '.migrated')
+        print(f"Migrated {len(loaded)} records from {legacy_path}")
+
+    @contextmanager
+    def _transaction(self):
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def _record(self, row):
+        if row is None:
+            return None
+        doc_id, data = row
+        record = json.loads(data)
+        with self.lock:
+            paths = [p for (p,) in self.conn.execute('SELECT path FROM paths WHERE doc_id = ? ORDER BY rowid', (doc_id,))]
+        aliases = [p for p in paths if p != record['path']]
+        if aliases:
+            record['aliases'] = aliases
+        return record
+
+    def _one(self, sql, params):
+        with self.lock:
+            row = self.conn.execute(sql, params).fetchone()
+        return self._record(row)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    # oldest first, a snapshot so callers may remove records while iterating
+    def __iter__(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT doc_id, data FROM documents ORDER BY timestamp').fetchall()
+        return iter([self._record(row) for row in rows])
+
+    def get(self, doc_id):
+        return self._one('SELECT doc_id, data FROM documents WHERE doc_id = ?', (doc_id,))
+
+    def get_by_hash(self, sha256):
+        return self._one('SELECT doc_id, data FROM documents WHERE sha256 = ?', (sha256,))
+
+    def get_by_path(self, path):
+        return self._one(
+            'SELECT d.doc_id, d.data FROM paths p JOIN documents d ON d.doc_id = p.doc_id WHERE p.path = ?', (path,)
+        )
+
+    def add(self, record):
+        data = {k: v for k, v in record.items() if k != 'aliases'}
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO documents (doc_id, sha256, timestamp, data) VALUES (?, ?, ?, ?)',
+                (record['doc_id'], record.get('sha256'), record['timestamp'], json.dumps(data))
+            )
+            for p in [record['path'], *record.get('aliases', [])]:
+                conn.execute('INSERT OR REPLACE INTO paths (path, doc_id) VALUES (?, ?)', (p, record['doc_id']))
+
+    # an identical file uploaded under another name points at the same record
+    def add_alias(self, record, path):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO paths (path, doc_id) VALUES (?, ?)', (path, record['doc_id']))
+
+    # merge fields into a record in place, atomic across workers
+    def update(self, doc_id, **fields):
+        with self.lock:
+            self.conn.execute('UPDATE documents SET data = json_patch(data, ?) WHERE doc_id = ?',
+                              (json.dumps(fields), doc_id))
+
+    # count a query against a document, the increment happens inside SQLite so no hit is lost
+    def touch(self, doc_id):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE documents SET data = json_set(data, '$.hits', COALESCE(json_extract(data, '$.hits'), 0) + 1, "
+                "'$.last_used', ?) WHERE doc_id = ?", (time.time(), doc_id)
+            )
+
+    def remove(self, doc_id):
+        record = self.get(doc_id)
+        if record is None:
+            return None
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM documents WHERE doc_id = ?', (doc_id,))
+            conn.execute('DELETE FROM paths WHERE doc_id = ?', (doc_id,))
+        return record
+
+    def _claim(self, name, owner):
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                'INSERT INTO locks (name, owner, acquired) VALUES (?, ?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, acquired = excluded.acquired '
+                'WHERE locks.owner = excluded.owner OR locks.acquired < ?',
+                (name, owner, now, now - self.lock_ttl)
+            )
+        return cursor.rowcount == 1
+
+    def _beat(self):
+        with self.lock:
+            for name, owner in list(self._held.items()):
+                self.conn.execute('UPDATE locks SET acquired = ? WHERE name = ? AND owner = ?',
+                                  (time.time(), name, owner))
+
+    # named lock held across worker processes, e.g. one ingestion per content hash;
+    # the heartbeat keeps it fresh, a holder that died is taken over after lock_ttl
+    @contextmanager
+    def hold(self, name, poll: float = 0.25):
+        owner = uuid.uuid4().hex
+        while not self._claim(name, owner):
+            time.sleep(poll)
+        with self.lock:
+            self._held[name] = owner
+        try:
+            yield
+        finally:
+            with self.lock:
+                self._held.pop(name, None)
+                self.conn.execute('DELETE FROM locks WHERE name = ? AND owner = ?', (name, owner))
+
+    # the document each client is currently asking about
+    def set_current(self, client_id, path):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO current_documents (client_id, path, updated) VALUES (?, ?, ?)',
+                              (client_id, path, time.time()))
+
+    def current(self, client_id):
+        with self.lock:
+            row = self.conn.execute('SELECT path FROM current_documents WHERE client_id = ?', (client_id,)).fetchone()
+        return row[0] if row else None
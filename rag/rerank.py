@@ -0,0 +1,55 @@
+import numpy as np
+
+from rag.lexical import tokenize
+
+
+def _unit_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+# max-marginal-relevance selection as matrix ops, returns candidate indexes in pick order
+def mmr(query_vector, candidate_vectors, k, lambda_mult: float = 0.5):
+    if len(candidate_vectors) == 0:
+        return []
+    candidates = _unit_rows(candidate_vectors)
+    relevance = candidates @ _unit_rows(query_vector)
+    similarity = candidates @ candidates.T
+
+    k = min(k, len(candidates))
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[:, selected[0]].copy()
+    for _ in range(k - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        redundancy = np.maximum(redundancy, similarity[:, pick])
+    return selected
+
+# cheap local cross-scorer: query term coverage, bigram matches and how tightly the hits cluster
+def cross_score(question, text):
+    terms = tokenize(question)
+    if not terms:
+        return 0.0
+    tokens = tokenize(text)
+    positions = {}
+    for i, token in enumerate(tokens):
+        positions.setdefault(token, []).append(i)
+
+    matched = [t for t in dict.fromkeys(terms) if t in positions]
+    coverage = len(matched) / len(set(terms))
+    bigrams = set(zip(tokens, tokens[1:]))
+    query_bigrams = list(zip(terms, terms[1:]))
+    phrase = sum(b in bigrams for b in query_bigrams) / len(query_bigrams) if query_bigrams else 0.0
+
+    # width of the smallest stretch holding the first occurrence of each matched term
+    firsts = sorted(positions[t][0] for t in matched)
+    proximity = len(matched) / (firsts[-1] - firsts[0] + 1) if len(firsts) > 1 else 0.0
+    return coverage + 0.5 * phrase + 0.25 * proximity
+
+# stable reorder of the retrieved chunks by the local cross-scorer
+def rerank(question, docs):
+    scores = [cross_score(question, d.page_content) for d in docs]
+    order = sorted(range(len(docs)), key=lambda i: (-scores[i], i))
+    return [docs[i] for i in order]
@@ -1,29 +1,42 @@
-from langchain.retrievers.multi_vector import MultiVectorRetriever
-from langchain.storage import InMemoryStore
-from langchain_chroma import Chroma
-from langchain_cohere import CohereEmbeddings
+from functools import lru_cache
 
-from rag.rag_constants import COHERE_API_KEY, COLLECTION_NAME
+from rag.rag_constants import (COLLECTION_NAME, DOCSTORE_FILE,
+                               EMBED_CACHE_DTYPE, EMBED_CACHE_FILE,
+                               EMBED_CACHE_MAX_BYTES)
+
+EMBED_MODEL = 'embed-english-v3.0'
+EMBED_DIM = 1024
+
+# services are built on first use, importing this module opens nothing
+
+
+# embedding model, wrapped so repeated chunks are never re-embedded
+@lru_cache(maxsize=None)
+def get_embedding_function():
+    from rag.embedding_cache import CachedEmbeddings
+    from utils.providers import get_cohere_embeddings
+    return CachedEmbeddings(
+        get_cohere_embeddings(EMBED_MODEL),
+        model=EMBED_MODEL,
+        path=EMBED_CACHE_FILE,
+        max_bytes=EMBED_CACHE_MAX_BYTES,
+        dtype=EMBED_CACHE_DTYPE
+    )
 
-# embedding model
-embedding_function = CohereEmbeddings(
-    model='embed-english-v3.0',
-    cohere_api_key=COHERE_API_KEY
-)
 
 # vector store config
-vectorstore = Chroma(
-    collection_name=COLLECTION_NAME,
-    persist_directory='./chroma_store',
-    embedding_function=embedding_function
-)
-
-# initiating the memory store
-docstore = InMemoryStore()
-
-# RAG retriever
-retriever = MultiVectorRetriever(
-    vectorstore=vectorstore,
-    docstore=docstore,
-    id_key='doc_id'
-)
+@lru_cache(maxsize=None)
+def get_vectorstore():
+    from langchain_chroma import Chroma
+    return Chroma(
+        collection_name=COLLECTION_NAME,
+        persist_directory='./chroma_store',
+        embedding_function=get_embedding_function()
+    )
+
+
+# persistent docstore, survives restarts alongside ./chroma_store
+@lru_cache(maxsize=None)
+def get_docstore():
+    from rag.docstore import SQLiteDocStore
+    return SQLiteDocStore(DOCSTORE_FILE)
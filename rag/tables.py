@@ -0,0 +1,180 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from rag.lexical import tokenize
+from rag.rag_constants import TABLE_DIR
+
+_ROW = re.compile(r'<tr[^>]*>(.*?)</tr>', re.S | re.I)
+_CELL = re.compile(r'<t[dh][^>]*>(.*?)</t[dh]>', re.S | re.I)
+_TAG = re.compile(r'<[^>]+>')
+_NUMBER = re.compile(r'[-+]?\d+(?:\.\d+)?')
+
+# question words that ask for an aggregate over a numeric column
+_AGGREGATES = {
+    'max': ('max', 'maximum', 'highest', 'largest', 'biggest', 'most', 'peak', 'top'),
+    'min': ('min', 'minimum', 'lowest', 'smallest', 'least', 'fewest'),
+    'mean': ('average', 'mean'),
+    'sum': ('total', 'sum'),
+}
+
+
+# cell text as a number: thousands separators, currency and % are ignored, anything else is NaN
+def _number(cell):
+    text = cell.replace(',', '').strip().lstrip('$€£').rstrip('%').strip()
+    match = _NUMBER.fullmatch(text)
+    return float(match.group()) if match else np.nan
+
+
+# one table held column-wise: header labels, cells as a 2-D string array and its numeric view
+class Table:
+    def __init__(self, header, cells, page=None, numeric=None):
+        self.header = list(header)
+        self.cells = np.asarray(cells, dtype=str).reshape(-1, len(self.header))
+        if numeric is None:
+            numeric = np.vectorize(_number, otypes=[np.float64])(self.cells) if self.cells.size else np.empty(self.cells.shape)
+        self.numeric = numeric
+        self.page = page
+
+    def __len__(self):
+        return self.cells.shape[0]
+
+    # columns where most cells parse as numbers
+    def numeric_columns(self):
+        if not len(self):
+            return []
+        filled = (~np.isnan(self.numeric)).mean(axis=0)
+        return [j for j, share in enumerate(filled) if share >= 0.6]
+
+    def grid(self, rows):
+        lines = [' | '.join(self.header)]
+        lines += [' | '.join(self.cells[i]) for i in rows]
+        return '\n'.join(lines)
+
+    # what the table holds, embedded in place of the whole table
+    def summary(self, index):
+        numeric = self.numeric_columns()
+        columns = []
+        for j, name in enumerate(self.header):
+            if j in numeric:
+                values = self.numeric[:, j]
+                columns.append(f"{name} (numeric, {np.nanmin(values):g} to {np.nanmax(values):g})")
+            else:
+                samples = [v for v in dict.fromkeys(self.cells[:, j]) if v][:3]
+                columns.append(f"{name} (e.g. {', '.join(samples)})" if samples else name)
+        where = f" on page {self.page}" if self.page else ''
+        return f"Table {index + 1}{where}: {len(self)} rows. Columns: " + '; '.join(columns)
+
+    def row_groups(self, size):
+        return [(start, min(start + size, len(self))) for start in range(0, len(self), size)]
+
+
+# parse table html into a Table, the first row is taken as the header; None when there is no body
+def parse_table(html, page=None):
+    rows = []
+    for row in _ROW.findall(html):
+        cells = [' '.join(_TAG.sub(' ', c).split()) for c in _CELL.findall(row)]
+        if any(cells):
+            rows.append(cells)
+    if len(rows) < 2:
+        return None
+    width = max(len(r) for r in rows)
+    rows = [r + [''] * (width - len(r)) for r in rows]
+    header = [h or f"Column {j + 1}" for j, h in enumerate(rows[0])]
+    return Table(header, rows[1:], page)
+
+
+# rows matching the question, plus any aggregate it asks for over the columns it names;
+# None when nothing in the table matches
+def lookup(table, question, max_rows: int):
+    terms = set(tokenize(question))
+    hits = np.array([len(terms.intersection(tokenize(' '.join(row)))) for row in table.cells])
+    matched = np.flatnonzero(hits)
+    rows = sorted(sorted(matched, key=lambda i: -hits[i])[:max_rows])
+
+    numeric = table.numeric_columns()
+    named = [j for j in numeric if terms.intersection(tokenize(table.header[j]))]
+    columns = named or (numeric if len(numeric) == 1 else [])
+    asked = question.lower()
+    scope = matched if matched.size else np.arange(len(table))
+    notes = []
+    for agg, words in _AGGREGATES.items():
+        if not any(re.search(rf'\b{w}\b', asked) for w in words):
+            continue
+        for j in columns:
+            values = table.numeric[scope, j]
+            if np.isnan(values).all():
+                continue
+            name = table.header[j]
+            if agg in ('max', 'min'):
+                pick = scope[np.nanargmax(values) if agg == 'max' else np.nanargmin(values)]
+                notes.append(f"{agg} {name}: {table.numeric[pick, j]:g} (row {pick + 1}: {' | '.join(table.cells[pick])})")
+                if pick not in rows:
+                    rows = sorted(rows + [pick])
+            else:
+                value = np.nanmean(values) if agg == 'mean' else np.nansum(values)
+                notes.append(f"{agg} {name}: {value:g} over {int((~np.isnan(values)).sum())} rows")
+
+    if not rows and not notes:
+        return None
+    return '\n'.join([table.grid(rows)] + notes)
+
+
+# per-document table store: one compressed npz of string and float arrays, keyed by table index
+
+_loaded = OrderedDict()
+_lock = threading.Lock()
+
+
+def _path(doc_id):
+    return os.path.join(TABLE_DIR, f"{doc_id}.npz")
+
+
+def save_tables(doc_id, tables):
+    if not tables:
+        return
+    os.makedirs(TABLE_DIR, exist_ok=True)
+    arrays = {'indexes': np.asarray(sorted(tables), dtype=np.int64)}
+    for i, t in tables.items():
+        arrays[f"header_{i}"] = np.asarray(t.header, dtype=str)
+        arrays[f"cells_{i}"] = t.cells
+        arrays[f"numeric_{i}"] = t.numeric
+        arrays[f"page_{i}"] = np.asarray(t.page or 0)
+    np.savez_compressed(_path(doc_id), **arrays)
+
+
+# loaded tables, the most recently used documents stay in memory
+def load_tables(doc_id, max_loaded: int = 16):
+    with _lock:
+        if doc_id in _loaded:
+            _loaded.move_to_end(doc_id)
+            return _loaded[doc_id]
+    path = _path(doc_id)
+    if not os.path.exists(path):
+        return {}
+    with np.load(path, allow_pickle=False) as data:
+        tables = {
+            int(i): Table(data[f"header_{i}"].tolist(), data[f"cells_{i}"], int(data[f"page_{i}"]) or None,
+                          data[f"numeric_{i}"])
+            for i in data['indexes']
+        }
+    with _lock:
+        _loaded[doc_id] = tables
+        while len(_loaded) > max_loaded:
+            _loaded.popitem(last=False)
+    return tables
+
+
+def delete_tables(doc_id):
+    with _lock:
+        _loaded.pop(doc_id, None)
+    if os.path.exists(_path(doc_id)):
+        os.remove(_path(doc_id))
+
+
+def table_bytes(doc_id):
+    path = _path(doc_id)
+    return os.path.getsize(path) if os.path.exists(path) else 0
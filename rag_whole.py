@@ -11,7 +11,6 @@ from typing import Dict, List
 import google.generativeai as genai
 import pymupdf4llm
 from dotenv import load_dotenv
-from groq import Groq
 from langchain.retrievers.multi_vector import MultiVectorRetriever
 from langchain.schema import Document
 from langchain.storage import InMemoryStore
@@ -20,6 +19,8 @@ from langchain_cohere import CohereEmbeddings
 from PIL import Image
 from unstructured.partition.pdf import partition_pdf
 
+from utils.providers import call, get_groq_client
+
 load_dotenv()
 
 # start timer
@@ -33,8 +34,8 @@ genai.configure(api_key=os.getenv("GEMINI_IMAGE_API_KEY"))
 assert groq_api_key, 'Set GROQ_API_KEY in .env'
 assert COHERE_API_KEY, 'Set COHERE_API_KEY in .env'
 
-# Initialize Groq client
-client = Groq(api_key=groq_api_key)
+# Shared Groq client (keep-alive pool, timeouts)
+client = get_groq_client()
 
 # Configuration
 COLLECTION_NAME = 'multi_modal_rag'
@@ -79,7 +80,7 @@ def caption_image(image_path: str) -> str:
     image_b64 = base64.b64encode(image_bytes).decode('utf-8')
     image_data_url = f"data:image/png;base64,{image_b64}"
     try:
-        completion = client.chat.completions.create(
+        completion = call('groq.caption', lambda: client.chat.completions.create(
             model='meta-llama/llama-4-scout-17b-16e-instruct',
             messages=[
                 {
@@ -100,7 +101,7 @@ def caption_image(image_path: str) -> str:
             max_completion_tokens=1000,
             top_p=1,
             stream=True
-        )
+        ))
         caption = ''
         for chunk in completion:
             caption += chunk.choices[0].delta.content or ''
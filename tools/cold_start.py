@@ -0,0 +1,56 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+# wall-clock budget for importing an entry point in a fresh interpreter
+COLD_START_BUDGET_S = float(os.getenv("COLD_START_BUDGET_S", 2.0))
+
+# what each entry point imports before it can serve; app.py runs Streamlit on import so its modules are listed
+TARGETS = {
+    'api': 'import main',
+    'streamlit': 'import rag.eviction, rag.query, rag.rag_pipeline, transcribe, utils.files, utils.providers',
+}
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# import in a fresh interpreter with -X importtime, returns wall seconds and the slowest top-level imports
+def measure(code, top: int = 10):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    slowest = []
+    for line in proc.stderr.splitlines():
+        m = re.match(r'import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)', line)
+        # only packages imported directly, nested imports are already counted in their parent
+        if m and len(m.group(2)) <= 1:
+            slowest.append((int(m.group(1)) / 1e6, m.group(3)))
+    return seconds, sorted(slowest, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold start of the API and Streamlit entry points.')
+    parser.add_argument('targets', nargs='*', default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument('--budget', type=float, default=COLD_START_BUDGET_S)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    over = False
+    for name in args.targets:
+        seconds, slowest = measure(TARGETS[name], args.top)
+        status = 'ok' if seconds <= args.budget else 'OVER BUDGET'
+        over = over or seconds > args.budget
+        print(f"{name}: {seconds:.2f}s (budget {args.budget:.2f}s) {status}")
+        for cumulative, module in slowest:
+            print(f"  {cumulative:6.3f}s  {module}")
+    sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,16 @@
 import json
 import os
+import queue
 import threading
+import time
+import wave
 from urllib.parse import urlencode
 
-import pyaudio
 from dotenv import load_dotenv
 from websocket import ABNF, WebSocketApp
 
+from utils.metrics import span
+
 load_dotenv()
 
 # config for api
@@ -21,69 +25,145 @@ WS_URL = "wss://streaming.assemblyai.com/v3/ws?" + urlencode(PARAMS)
 # Audio settings
 RATE = 16000
 CHANNELS = 1
-FORMAT = pyaudio.paInt16
-CHUNK = int(0.05 * RATE)  # 50 ms
+CHUNK = int(0.05 * RATE)  # 50 ms
+
+_pyaudio = None
+_pyaudio_lock = threading.Lock()
 
-# Sync primitives
-_done = threading.Event()
-_result = {"text": ""}
 
+# one PyAudio instance for the whole process, opening it per question is slow
+def _get_pyaudio():
+    global _pyaudio
+    with _pyaudio_lock:
+        if _pyaudio is None:
+            import pyaudio
+            _pyaudio = pyaudio.PyAudio()
+        return _pyaudio
 
-def _on_open(ws):
-    def _stream():
-        audio = pyaudio.PyAudio()
-        stream = audio.open(format=FORMAT, channels=CHANNELS,
-                            rate=RATE, input=True, frames_per_buffer=CHUNK)
+
+# 16-bit PCM frames from the local microphone
+class MicrophoneSource:
+    def __iter__(self):
+        import pyaudio
+        stream = _get_pyaudio().open(format=pyaudio.paInt16, channels=CHANNELS,
+                                     rate=RATE, input=True, frames_per_buffer=CHUNK)
         try:
-            while not _done.is_set():
-                data = stream.read(CHUNK, exception_on_overflow=False)
-                ws.send(data, ABNF.OPCODE_BINARY)
+            while True:
+                yield stream.read(CHUNK, exception_on_overflow=False)
         finally:
             stream.stop_stream()
             stream.close()
-            audio.terminate()
-    threading.Thread(target=_stream, daemon=True).start()
-
-
-def _on_message(ws, message):
-    obj = json.loads(message)
-    if obj.get("type") == "Turn" and obj.get("turn_is_formatted"):
-        _result["text"] = obj.get("transcript", "")
-        _done.set()
-        ws.close()
-
-
-def _on_error(ws, err):
-    print("WebSocket error:", err)
-    _done.set()
-
-
-def _on_close(ws, code, reason):
-    _done.set()
-
-
-def transcribe_user_question(timeout: float = 10.0) -> str:
-    _done.clear()
-    _result["text"] = ""
-
-    ws = WebSocketApp(
-        WS_URL,
-        header=[f"Authorization: {API_KEY}"],
-        on_open=_on_open,
-        on_message=_on_message,
-        on_error=_on_error,
-        on_close=_on_close,
-    )
-
-    # run WS in background
-    thread = threading.Thread(target=ws.run_forever, daemon=True)
-    thread.start()
 
-    # wait for result or timeout (max 60 seconds to be safe)
-    try:
-        _done.wait(timeout=min(timeout, 60.0))  # cap timeout to avoid OverflowError
-    except OverflowError:
-        print("Invalid timeout value. Using 10 seconds fallback.")
-        _done.wait(timeout=10.0)
 
-    return _result["text"] or "No speech detected"
+# replays a recorded 16 kHz mono WAV file in real time, for tests against a local socket
+class WavFileSource:
+    def __init__(self, path, realtime: bool = True):
+        self.path = path
+        self.realtime = realtime
+
+    def __iter__(self):
+        with wave.open(self.path, 'rb') as wav:
+            while True:
+                data = wav.readframes(CHUNK)
+                if not data:
+                    return
+                yield data
+                if self.realtime:
+                    time.sleep(CHUNK / RATE)
+
+
+# frames pushed by another thread, e.g. audio arriving from a client over a WebSocket
+class QueueSource:
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def put(self, frame):
+        self.queue.put(frame)
+
+    def close(self):
+        self.queue.put(None)
+
+    def __iter__(self):
+        while (frame := self.queue.get()) is not None:
+            yield frame
+
+
+# one question's worth of streaming transcription, state is per session so requests do not collide
+class TranscriptionSession:
+    def __init__(self, audio_source=None, ws_url: str = WS_URL, api_key: str = API_KEY, on_partial=None):
+        self.audio_source = audio_source if audio_source is not None else MicrophoneSource()
+        self.ws_url = ws_url
+        self.api_key = api_key
+        self.on_partial = on_partial
+        self.done = threading.Event()
+        self.text = ""
+        self.bytes_sent = 0
+
+    def _on_open(self, ws):
+        def _stream():
+            frames = iter(self.audio_source)
+            try:
+                for data in frames:
+                    if self.done.is_set():
+                        break
+                    ws.send(data, ABNF.OPCODE_BINARY)
+                    self.bytes_sent += len(data)
+                else:
+                    # finite source ran out (trimmed clip, client stopped): finalize now instead of waiting for endpointing
+                    if not self.done.is_set():
+                        ws.send(json.dumps({"type": "ForceEndpoint"}))
+            finally:
+                close = getattr(frames, 'close', None)
+                if close:
+                    close()
+        threading.Thread(target=_stream, daemon=True).start()
+
+    def _on_message(self, ws, message):
+        obj = json.loads(message)
+        if obj.get("type") != "Turn":
+            return
+        if obj.get("turn_is_formatted"):
+            self.text = obj.get("transcript", "")
+            self.done.set()
+            ws.close()
+        elif self.on_partial and obj.get("transcript"):
+            # unformatted partial turns, used to start retrieval before the speaker finishes
+            self.on_partial(obj["transcript"], bool(obj.get("end_of_turn")))
+
+    def _on_error(self, ws, err):
+        print("WebSocket error:", err)
+        self.done.set()
+
+    def _on_close(self, ws, code, reason):
+        self.done.set()
+
+    def run(self, timeout: float = 10.0) -> str:
+        with span('transcription') as sizes:
+            ws = WebSocketApp(
+                self.ws_url,
+                header=[f"Authorization: {self.api_key}"],
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+            )
+
+            # run WS in background
+            thread = threading.Thread(target=ws.run_forever, daemon=True)
+            thread.start()
+
+            # wait for result or timeout (max 60 seconds to be safe)
+            try:
+                self.done.wait(timeout=min(timeout, 60.0))  # cap timeout to avoid OverflowError
+            except OverflowError:
+                print("Invalid timeout value. Using 10 seconds fallback.")
+                self.done.wait(timeout=10.0)
+            self.done.set()
+            ws.close()
+            sizes.update(bytes=self.bytes_sent, words=len(self.text.split()))
+
+        return self.text or "No speech detected"
+
+
+def transcribe_user_question(timeout: float = 10.0, on_partial=None) -> str:
+    return TranscriptionSession(on_partial=on_partial).run(timeout)
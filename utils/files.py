@@ -0,0 +1,38 @@
+import hashlib
+import os
+import tempfile
+
+from utils.sqlite_cache import content_key
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+# per-client upload directory, so two users' files of the same name never collide
+# (and one never replaces the other as a stale version)
+def client_upload_dir(root, client):
+    path = os.path.join(root, content_key(client)[:16])
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# stream src to dest in fixed-size chunks, hashing and counting on the way
+# the file only appears at dest once it is complete (temp file + rename)
+def save_upload(src, dest, max_bytes: int, chunk_size: int = 1024 * 1024):
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest) or '.', prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for block in iter(lambda: src.read(chunk_size), b''):
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds the {max_bytes} byte upload limit")
+                h.update(block)
+                out.write(block)
+        os.replace(tmp, dest)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return h.hexdigest(), size
@@ -1,22 +1,13 @@
-import os
+import time
 
-import google.generativeai as genai
-from dotenv import load_dotenv
+from utils.metrics import record, span
+from utils.providers import PROVIDER_TIMEOUT, ProviderError, call, get_gemini_model
 
-load_dotenv()
+GEMINI_MODEL = "models/gemini-2.5-flash-lite-preview-06-17"
 
-# configure gemini with credentials
-def configure_gemini():
-    api_key = os.getenv("GEMINI_IMAGE_API_KEY")
-    assert api_key, "GEMINI_IMAGE_API_KEY not set"
-    genai.configure(api_key=api_key)
-
-# answer generation
-def answer_with_gemini(question: str, context_chunks: list) -> str:
-    try:
-        model = genai.GenerativeModel("models/gemini-2.5-flash-lite-preview-06-17")
-        context = "\n\n".join(context_chunks)
-        prompt = f"""You are an assistant helping with document analysis.
+def build_prompt(question: str, context_chunks: list) -> str:
+    context = "\n\n".join(context_chunks)
+    return f"""You are an assistant helping with document analysis.
 
             Use the context provided below to answer the user question.
         
@@ -26,8 +17,43 @@ def answer_with_gemini(question: str, context_chunks: list) -> str:
             Question: {question}
         
             Answer the question accurately and concisely based only on the context."""
-            
-        response = model.generate_content(prompt)
+
+# answer generation, raises ProviderError once retries are exhausted
+def answer_with_gemini(question: str, context_chunks: list, doc_id: str = None) -> str:
+    model = get_gemini_model(GEMINI_MODEL)
+    prompt = build_prompt(question, context_chunks)
+    with span('generation', doc_id, prompt_bytes=len(prompt.encode('utf-8'))) as sizes:
+        response = call(
+            'gemini.generate',
+            lambda: model.generate_content(prompt, request_options={'timeout': PROVIDER_TIMEOUT}),
+            hedge=True
+        )
+        usage = getattr(response, 'usage_metadata', None)
+        if usage:
+            sizes.update(prompt_tokens=usage.prompt_token_count, tokens=usage.candidates_token_count)
+    # .text raises ValueError when the candidate was blocked or came back empty
+    try:
         return response.text.strip()
-    except Exception as e:
-        return f"Gemini error: {e}"
\ No newline at end of file
+    except ValueError as e:
+        raise ProviderError(f"gemini.generate returned no text: {e}") from e
+
+# answer generation, yielding text as the model produces it
+# only opening the stream is retried, a stream that fails midway raises ProviderError
+def stream_answer_with_gemini(question: str, context_chunks: list, doc_id: str = None):
+    model = get_gemini_model(GEMINI_MODEL)
+    prompt = build_prompt(question, context_chunks)
+    start = time.perf_counter()
+    with span('generation', doc_id, prompt_bytes=len(prompt.encode('utf-8')), tokens=0) as sizes:
+        stream = call(
+            'gemini.stream',
+            lambda: model.generate_content(prompt, stream=True, request_options={'timeout': PROVIDER_TIMEOUT})
+        )
+        try:
+            for chunk in stream:
+                if chunk.parts:
+                    if not sizes['tokens']:
+                        record('first_token', time.perf_counter() - start, doc_id)
+                    sizes['tokens'] += 1
+                    yield chunk.text
+        except Exception as e:
+            raise ProviderError(f"gemini.stream failed: {e}") from e
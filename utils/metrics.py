@@ -0,0 +1,118 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from utils.providers import provider_stats
+
+# log every finished span as one JSON line
+SPAN_LOG = os.getenv("SPAN_LOG", 'false').lower() == 'true'
+
+# stage latency buckets in seconds, from a cached lookup up to a long ingestion
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_lock = threading.Lock()
+# (stage, status) -> [bucket counts..., +Inf count], and the running sum of seconds
+_histogram = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+_seconds = defaultdict(float)
+# (size name, stage) -> running total, e.g. chunks embedded or bytes captioned
+_sizes = defaultdict(float)
+
+# spans finished while serving the current request, when the request asked for a breakdown
+_timings = contextvars.ContextVar('timings', default=None)
+# document of the enclosing span, inherited by spans opened inside it (e.g. embedding under chroma_upsert)
+_doc_id = contextvars.ContextVar('doc_id', default=None)
+
+
+# record one finished stage; doc_id and sizes go to the span log and request timings,
+# only stage and status become metric labels so the series count stays bounded
+def record(stage, seconds, doc_id=None, status='ok', **sizes):
+    with _lock:
+        counts = _histogram[(stage, status)]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        _seconds[(stage, status)] += seconds
+        for name, value in sizes.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                _sizes[(name, stage)] += value
+
+    entry = {'stage': stage, 'seconds': round(seconds, 6), 'status': status, **sizes}
+    if doc_id:
+        entry['doc_id'] = doc_id
+    timings = _timings.get()
+    if timings is not None:
+        timings.append(entry)
+    if SPAN_LOG:
+        print(json.dumps(entry))
+
+
+# time a block as one stage, sizes known only after the work can be set on the yielded dict;
+# without a doc_id the span takes the one of the span it runs in
+@contextmanager
+def span(stage, doc_id=None, **sizes):
+    outer = _doc_id.get()
+    doc_id = doc_id or outer
+    _doc_id.set(doc_id)
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield sizes
+    except GeneratorExit:
+        # a consumer that stops reading a stream early is not a failure
+        raise
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, doc_id, status, **sizes)
+        # set rather than reset: a span in a streamed generator may close in another context
+        _doc_id.set(outer)
+
+
+# collect the spans of everything run in this context (and contexts copied from it)
+@contextmanager
+def collect():
+    timings = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+
+
+# Prometheus text exposition format
+def render():
+    lines = [
+        '# HELP rag_stage_seconds Time spent per pipeline stage.',
+        '# TYPE rag_stage_seconds histogram'
+    ]
+    with _lock:
+        for (stage, status), counts in sorted(_histogram.items()):
+            for bound, count in zip(BUCKETS, counts):
+                lines.append(f"rag_stage_seconds_bucket{_labels(stage=stage, status=status, le=bound)} {count}")
+            lines.append(f"rag_stage_seconds_bucket{_labels(stage=stage, status=status, le='+Inf')} {counts[-1]}")
+            lines.append(f"rag_stage_seconds_sum{_labels(stage=stage, status=status)} {_seconds[(stage, status)]}")
+            lines.append(f"rag_stage_seconds_count{_labels(stage=stage, status=status)} {counts[-1]}")
+
+        for name in sorted({name for name, _ in _sizes}):
+            lines += [f'# HELP rag_stage_{name}_total Total {name} processed per stage.',
+                      f'# TYPE rag_stage_{name}_total counter']
+            lines += [f"rag_stage_{name}_total{_labels(stage=stage)} {value}"
+                      for (n, stage), value in sorted(_sizes.items()) if n == name]
+
+    stats = provider_stats()
+    for key, kind in (('calls', 'counter'), ('errors', 'counter'), ('retries', 'counter'),
+                      ('hedges', 'counter'), ('seconds', 'counter'), ('max_seconds', 'gauge')):
+        metric = f"rag_provider_{key}" + ('_total' if kind == 'counter' else '')
+        lines += [f'# HELP {metric} Provider {key.replace("_", " ")} per operation.', f'# TYPE {metric} {kind}']
+        lines += [f"{metric}{_labels(op=op)} {entry[key]}" for op, entry in sorted(stats.items())]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,126 @@
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# per-call deadline (seconds), retries on transient errors, and how long to wait before hedging
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", 60))
+PROVIDER_RETRIES = int(os.getenv("PROVIDER_RETRIES", 3))
+PROVIDER_POOL_SIZE = int(os.getenv("PROVIDER_POOL_SIZE", 16))
+HEDGE_AFTER = float(os.getenv("HEDGE_AFTER", 0)) or None
+
+
+class ProviderError(RuntimeError):
+    pass
+
+
+# status codes and exception names that are worth retrying
+_TRANSIENT_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+_TRANSIENT_NAMES = ('Timeout', 'Connection', 'RateLimit', 'ServiceUnavailable', 'ResourceExhausted',
+                    'InternalServerError', 'DeadlineExceeded', 'TooManyRequests')
+
+
+def is_transient(error):
+    code = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    if isinstance(code, int) and code in _TRANSIENT_CODES:
+        return True
+    return any(name in type(error).__name__ for name in _TRANSIENT_NAMES)
+
+
+# call counts and latency per provider operation
+_stats = defaultdict(lambda: {'calls': 0, 'errors': 0, 'retries': 0, 'hedges': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+_stats_lock = threading.Lock()
+_hedge_pool = ThreadPoolExecutor(max_workers=PROVIDER_POOL_SIZE, thread_name_prefix='hedge')
+
+
+def _record(name, key, seconds=None):
+    with _stats_lock:
+        entry = _stats[name]
+        entry[key] += 1
+        if seconds is not None:
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+
+
+def provider_stats():
+    with _stats_lock:
+        return {name: dict(entry) for name, entry in _stats.items()}
+
+
+# start fn, and if it has not finished after `after` seconds start a second copy; first success wins
+def _hedged(name, fn, after):
+    first = _hedge_pool.submit(fn)
+    done, _ = wait([first], timeout=after)
+    if done:
+        return first.result()
+    _record(name, 'hedges')
+    pending = {first, _hedge_pool.submit(fn)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+# instrumented provider call with retry on transient errors, an overall deadline and optional hedging
+def call(name, fn, retries: int = PROVIDER_RETRIES, deadline: float = PROVIDER_TIMEOUT, hedge: bool = False,
+         base_delay: float = 0.5, max_delay: float = 8.0):
+    start = time.monotonic()
+    for attempt in range(retries + 1):
+        attempt_start = time.monotonic()
+        try:
+            result = _hedged(name, fn, HEDGE_AFTER) if hedge and HEDGE_AFTER else fn()
+            _record(name, 'calls', time.monotonic() - attempt_start)
+            return result
+        except Exception as e:
+            _record(name, 'errors', time.monotonic() - attempt_start)
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            out_of_time = time.monotonic() - start + delay > deadline
+            if attempt == retries or out_of_time or not is_transient(e):
+                raise ProviderError(f"{name} failed: {e}") from e
+            _record(name, 'retries')
+            print(f"Retrying {name} after error ({attempt + 1}/{retries}): {e}")
+            time.sleep(delay)
+
+
+# shared clients, built once per process and reused across requests
+
+@lru_cache(maxsize=None)
+def get_groq_client():
+    import httpx
+    from groq import Groq
+    api_key = os.getenv("GROQ_API_KEY")
+    assert api_key, 'Set GROQ_API_KEY in .env'
+    # keep-alive pool shared by every caption / chat request, retries are handled by call()
+    http_client = httpx.Client(
+        timeout=PROVIDER_TIMEOUT,
+        limits=httpx.Limits(max_connections=PROVIDER_POOL_SIZE, max_keepalive_connections=PROVIDER_POOL_SIZE)
+    )
+    return Groq(api_key=api_key, http_client=http_client, timeout=PROVIDER_TIMEOUT, max_retries=0)
+
+
+@lru_cache(maxsize=None)
+def get_gemini_model(name: str):
+    import google.generativeai as genai
+    api_key = os.getenv("GEMINI_IMAGE_API_KEY")
+    assert api_key, "GEMINI_IMAGE_API_KEY not set"
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(name)
+
+
+@lru_cache(maxsize=None)
+def get_cohere_embeddings(model: str):
+    from langchain_cohere import CohereEmbeddings
+    api_key = os.getenv("COHERE_API_KEY")
+    assert api_key, 'Set COHERE_API_KEY in .env'
+    return CohereEmbeddings(model=model, cohere_api_key=api_key, max_retries=0, request_timeout=PROVIDER_TIMEOUT)
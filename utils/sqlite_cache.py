@@ -0,0 +1,106 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+# hash any mix of bytes / str parts into a stable cache key
+def content_key(*parts) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        if isinstance(p, str):
+            p = p.encode('utf-8')
+        h.update(len(p).to_bytes(8, 'big'))
+        h.update(p)
+    return h.hexdigest()
+
+
+# single-file key/value cache with size-bounded LRU eviction
+class SQLiteCache:
+    # eviction frees down to this share of max_bytes, so a full cache does not evict on every insert
+    LOW_WATER = 0.9
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+        self.conn.commit()
+        # running byte total, measured once here so inserts never scan the table
+        self.total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    # fetch several keys in one query, bumping their access time
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.conn.executemany('UPDATE cache SET accessed = ? WHERE key = ?', [(now, k) for k in found])
+                self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        now = time.time()
+        rows = [(k, v, len(v), now) for k, v in items.items()]
+        keys = [r[0] for r in rows]
+        with self.lock:
+            # replaced entries give their old size back
+            replaced = 0
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                replaced += self.conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM cache WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchone()[0]
+            self.conn.executemany('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)', rows)
+            self.total += sum(r[2] for r in rows) - replaced
+            if self.total > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    # drop least recently used entries until the cache is back under the low-water mark
+    def _evict(self):
+        # re-measured here, other processes sharing the file insert and evict too
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+        self.total = total
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * self.LOW_WATER)
+        freed = 0
+        stale = []
+        for key, size in self.conn.execute('SELECT key, size FROM cache ORDER BY accessed'):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.conn.executemany('DELETE FROM cache WHERE key = ?', stale)
+        self.total = total - freed
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
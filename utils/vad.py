@@ -0,0 +1,82 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * 2  # 16-bit mono
+
+
+# energy-based voice activity detection over 16 kHz 16-bit mono PCM
+# drops leading silence (keeping a short pre-roll), and reports end of speech
+# after `hangover_ms` of silence following speech
+class VoiceActivityDetector:
+    def __init__(self, threshold_ratio: float = 3.0, min_rms: float = 300.0,
+                 preroll_ms: int = 240, hangover_ms: int = 800, tail_ms: int = 150):
+        self.threshold_ratio = threshold_ratio
+        self.min_rms = min_rms
+        self.preroll = preroll_ms // FRAME_MS
+        self.hangover = hangover_ms // FRAME_MS
+        self.tail = tail_ms // FRAME_MS
+        self.noise = None
+        self.buffer = b''
+        self.pending = []  # silent frames held back until we know whether speech follows
+        self.in_speech = False
+        self.silent_run = 0
+        self.ended = False
+        self.frames_in = 0
+        self.frames_out = 0
+
+    def _is_speech(self, frame):
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples ** 2))) if samples.size else 0.0
+        speech = rms > max(self.min_rms, (self.noise or 0.0) * self.threshold_ratio)
+        # noise floor follows the frames classified as silence only
+        if not speech:
+            self.noise = rms if self.noise is None else 0.95 * self.noise + 0.05 * rms
+        return speech
+
+    # feed raw PCM bytes of any length, returns the frames worth forwarding to STT
+    def feed(self, data):
+        self.buffer += data
+        out = []
+        while len(self.buffer) >= FRAME_BYTES and not self.ended:
+            frame, self.buffer = self.buffer[:FRAME_BYTES], self.buffer[FRAME_BYTES:]
+            self.frames_in += 1
+            if self._is_speech(frame):
+                if not self.in_speech:
+                    out.extend(self.pending[-self.preroll:])
+                else:
+                    out.extend(self.pending)
+                self.pending = []
+                self.in_speech = True
+                self.silent_run = 0
+                out.append(frame)
+                continue
+
+            self.pending.append(frame)
+            if self.in_speech:
+                self.silent_run += 1
+                if self.silent_run >= self.hangover:
+                    # keep a short tail so the last word is not clipped
+                    out.extend(self.pending[:self.tail])
+                    self.pending = []
+                    self.ended = True
+            else:
+                self.pending = self.pending[-self.preroll:]
+        self.frames_out += len(out)
+        return out
+
+    # flush at end of input, trailing silence is dropped
+    def finish(self):
+        out = self.pending[:self.tail] if self.in_speech else []
+        self.pending = []
+        self.ended = True
+        self.frames_out += len(out)
+        return out
+
+
+# trim leading and trailing silence from a whole clip, returns the frames to send
+def trim_silence(pcm):
+    vad = VoiceActivityDetector()
+    frames = vad.feed(pcm)
+    frames += vad.finish()
+    return frames, vad